@@ -1,16 +1,34 @@
+import time
+startupTimes = {}
+startupClock = [time.perf_counter()]
+def StartupMark(label):
+    """
+    Record the time spent since the previous mark (--profile-startup)
+    """
+    now = time.perf_counter()
+    startupTimes[label] = now-startupClock[0]
+    startupClock[0] = now
+
+import sys
+import os
+import csv
+import numbers
+from collections import deque
+StartupMark('stdlib')
 import numpy as np
+StartupMark('numpy')
 import jos3
-import pandas as pd
-import matplotlib.pyplot as plt
+StartupMark('jos3')
 #import BerkeleyModel
-import sys
+# pandas is only imported on the rare paths that need it (see DriverFile.append)
 
 """ 
 Modification based on heat fluxes from CFD and evaporation from skin
     
 """
-## Create human models
-Driver=jos3.JOS3(height=1.8,weight=75,age=30,ex_output="all")
+## Create human models (setpoints are cached on disc, the single-step mode creates the model every coupling step)
+Driver=jos3.JOS3(height=1.8,weight=75,age=30,ex_output="all",setpt_cache=jos3.SetptCache(folder='setptCache'))
+StartupMark('model')
 
 
 # Environmental condition setup according to the simulation
@@ -27,6 +45,7 @@ try:
     dtCFD = eval(sys.argv[1])
 except:
     dtCFD = 0.05 #s
+monitorSpan = 2*dt #s, longest time average of the CFD monitors (heat flux)
 
 
 def clothingReq(Ta):
@@ -73,6 +92,9 @@ Driver.Icl=clothingReq(ambTemp)
 Driver.PAR = activityLevel
 Driver.posture='sitting'
 soakTime = 5 # min
+soakSteady = False # soak to the converged steady state instead of for soakTime
+soakLibrary = jos3.SoakLibrary(folder='soakLibrary',interpolate=False) # soaked states shared by the runs
+startupBudget = 0.5 # s, import and set up time of a coupling step
 
 ## Don't mess with me ##
 sections=['head','face','neck','breathZone','chest','back','pelvis','lUArm',
@@ -123,55 +145,191 @@ corrDictJOSToBerk={'Head':'head',
 ## Function definitions
 def InitSolution(model,ambTemp,velocity,radTemp,RH,time):
     """
-    Generate initial skin temperature based on soaked conditions
+    Generate initial skin temperature based on soaked conditions (steady state if time is None)
     """
     model.Ta=ambTemp
     model.Va=velocity
     model.Tr=radTemp
     model.RH=RH
-    model.simulate(1,time*60)
+    if model.soak(None if time is None else time*60,library=soakLibrary):
+        print('Soaked state from the library')
+    elif time is None:
+        print('Steady soak:',model.soak_report)
     model.simulate(1,dt)
     return model
 
-def WriteToCSVForCFD(model,file,new,history):
+def WriteToCSVForCFD(model,driverFile,new):
     """
     Write solution to *.csv file based on the solution
     """
-    df = pd.DataFrame(model.dict_results())
-    df = df.drop(columns=['ModTime'])
-    for col in df.columns:
-        df=df.rename(columns={col:col+'(C)'})
+    if new ==1:
+        time = [-soakTime*60,0,dt]
+    else:
+        time = [driverFile.last['time(s)'], driverFile.last['time(s)']+dt]
+
+    # Only the rows of this coupling step are written (the model keeps its history in server mode)
+    table = {'time(s)':time}
+    for key,values in model.dict_results(last=len(time)).items():
+        if key!='ModTime':
+            table[key+'(C)'] = values
     
-    df = surfaceTemperatureForCFD(model,df,new)
+    table = surfaceTemperatureForCFD(model,table,new)
     
     if new ==1:
-        time = [-soakTime*60,0,dt]
-        df.insert(loc=0,column='time(s)',value=time)
-        df.to_csv(file+'.csv',index=0)
+        driverFile.write(table)
         
     else:
-        time = [history['time(s)'].iloc[-1], history['time(s)'].iloc[-1]+dt]
-        df.insert(loc=0,column='time(s)',value=time)
-        history=history.append(df.iloc[-1])
-        history.to_csv(file+'.csv',index=0)
+        # The first row repeats the last row of the previous coupling step
+        driverFile.append({col:values[-1:] for col,values in table.items()})
+
+def FormatColumn(values):
+    """
+    Format the values of a column for the csv files the way pandas writes them
+    (integers as integers, numbers as floats once a column holds a float, missing values empty)
+    """
+    if all(isinstance(v,numbers.Integral) and not isinstance(v,(bool,np.bool_)) for v in values):
+        return [str(int(v)) for v in values]
+    if all(isinstance(v,numbers.Real) and not isinstance(v,(bool,np.bool_)) for v in values):
+        return ['' if v!=v else repr(float(v)) for v in values]
+    return [str(v) for v in values]
+
+def ParseValue(text):
+    """
+    Convert a value read from the csv files back to a number where possible
+    """
+    for convert in (int,float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+def WriteRows(path,columns,rows):
+    """
+    Write a csv file with a header
+    """
+    with open(path,'w',newline='') as f:
+        writer = csv.writer(f,lineterminator=os.linesep)
+        writer.writerow(columns)
+        writer.writerows(rows)
+        
+class DriverFile:
+    """
+    Append-only writer for the driver history (driver.csv).
+    
+    The header is written once and every coupling step appends its new row. The last row is kept in memory
+    and in a small sidecar file (driverLast.csv) so a coupling step never parses the whole history.
+    
+    The boundary conditions for CFD (time, Tcl*, mEvap*) of the last cfdPoints coupling times are written
+    to a separate fixed-size table (driverCFD.csv), so the table reloaded by STAR-CCM+ does not grow with the run.
+    
+    Tables are passed as dictionaries of column lists and written with the csv module.
+    """
+    def __init__(self,file='driver',cfdPoints=3):
+        self.path = file+'.csv'
+        self.lastPath = file+'Last.csv'
+        self.cfdPath = file+'CFD.csv'
+        self.cfdPoints = cfdPoints
+        self.columns = None
+        self.last = None
+        self.cfdColumns = None
+        self.cfd = None
+        
+    def load(self):
+        """
+        Load the last row from the sidecar, or from the history if the sidecar is missing
+        """
+        try:
+            with open(self.lastPath,newline='') as f:
+                columns,lastRow = list(csv.reader(f))[:2]
+            with open(self.cfdPath,newline='') as f:
+                reader = csv.reader(f)
+                self.cfdColumns = next(reader)
+                self.cfd = list(reader)
+        except FileNotFoundError:
+            ## Stream the history once, keeping only the last rows
+            with open(self.path,newline='') as f:
+                reader = csv.reader(f)
+                columns = next(reader)
+                rows = list(deque(reader,maxlen=self.cfdPoints))
+            lastRow = rows[-1]
+            WriteRows(self.lastPath,columns,[lastRow])
+            self._writeCFD(columns,rows,[],new=True)
+        self.columns = columns
+        self.last = dict(zip(columns,map(ParseValue,lastRow)))
+        
+    def write(self,table):
+        """
+        Start a new history with the rows in table
+        """
+        columns,rows = self._rows(table)
+        WriteRows(self.path,columns,rows)
+        self._writeCFD(columns,rows,[],new=True)
+        self._setLast(table,columns,rows)
+        
+    def append(self,table):
+        """
+        Append the rows in table to the history
+        """
+        columns,rows = self._rows(table)
+        if columns!=self.columns:
+            ## The output columns changed; rewrite the history once with the new columns
+            import pandas as pd
+            history = pd.concat([pd.read_csv(self.path),pd.DataFrame(table)],ignore_index=True)
+            history.to_csv(self.path,index=0)
+        else:
+            with open(self.path,'a',newline='') as f:
+                csv.writer(f,lineterminator=os.linesep).writerows(rows)
+        self._writeCFD(columns,rows,self.cfd)
+        self._setLast(table,columns,rows)
+    
+    def _rows(self,table):
+        columns = list(table)
+        return columns,[list(row) for row in zip(*[FormatColumn(values) for values in table.values()])]
+    
+    def _setLast(self,table,columns,rows):
+        WriteRows(self.lastPath,columns,rows[-1:])
+        self.columns = columns
+        self.last = {col:values[-1] for col,values in table.items()}
         
-def RenameColumnsCFD(case):
+    def _writeCFD(self,columns,rows,previous,new=False):
+        """
+        Write the CFD boundary conditions of the last cfdPoints rows
+        """
+        if new:
+            self.cfdColumns = ['time(s)']+[col for col in columns if col[:3]=='Tcl' or col[:5]=='mEvap']
+        index = [columns.index(col) for col in self.cfdColumns]
+        self.cfd = (previous+[[row[i] for i in index] for row in rows])[-self.cfdPoints:]
+        WriteRows(self.cfdPath,self.cfdColumns,self.cfd)
+
+def RenameColumnsCFD(columnNames):
     """
     Renames columns from CFD exports
     """
-    columnNames = case.columns
     columns=[columnNames[0]]
     for col in columnNames[1:]:
         colTemp = col.find(' Monitor')
         columns.append(col[:colTemp])
     
-    columns=pd.Index(columns)
-    case.columns=columns
-    #case.rename(thCFD,axis='columns',inplace='True')
+    return columns
+
+class MonitorColumns:
+    """
+    Column map of the CFD monitor export, compiled once per header.
     
-    return case
+    index holds the column indices of the air temperature, RH, heat flux and operative temperature
+    monitors (rows, see quantities) of the body parts in sectionsJOS3 order, so the inputs of a coupling
+    step are taken from the monitor array with a single indexing operation.
+    """
+    quantities = ['Temp_human.Driver_','RH_human.Driver_','heatFlux_human.Driver_','To_human.Driver_']
+    
+    def __init__(self,header):
+        columns = {col:j for j,col in enumerate(RenameColumnsCFD(header))}
+        self.time = 0
+        self.index = np.array([[columns[quantity+corrDictJOSToBerk[val]] for val in sectionsJOS3]
+                               for quantity in self.quantities])
 
-def surfaceTemperatureForCFD(model,df,new):
+def surfaceTemperatureForCFD(model,table,new):
     """
     Compute the clothing temperature from skin temperature and heat flux.
     Additionally, compute the vapor flux based on the latent heat flux.
@@ -181,105 +339,319 @@ def surfaceTemperatureForCFD(model,df,new):
     evaporationFlux = []  
     
     for i in range(len(sectionsJOS3)):
-        #Q = (df['Tsk'+sectionsJOS3[i]+'(C)'].iloc[-2:]-model.Ta[i])/(R_clothing[i]+R_hc[i])
-        Q = (df['SHLsk'+sectionsJOS3[i]+'(C)'].iloc[-2:])
-        Tcl.append(df['Tsk'+sectionsJOS3[i]+'(C)'].iloc[-2:]-Q/Driver.BSA[i]*R_clothing[i])
+        #Q = (table['Tsk'+sectionsJOS3[i]+'(C)'][-2:]-model.Ta[i])/(R_clothing[i]+R_hc[i])
+        Q = np.array(table['SHLsk'+sectionsJOS3[i]+'(C)'][-2:])
+        Tcl.append(np.array(table['Tsk'+sectionsJOS3[i]+'(C)'][-2:])-Q/model.BSA[i]*R_clothing[i])
 
-        QEvap = (df['LHLsk'+sectionsJOS3[i]+'(C)'].iloc[-2:])/Driver.BSA[i]        
+        QEvap = np.array(table['LHLsk'+sectionsJOS3[i]+'(C)'][-2:])/model.BSA[i]        
         evaporationFlux.append(QEvap/2418.7e3)
     for i in range(len(sectionsJOS3)):
         if new==1:
-            clothTemp = [Tcl[i].iloc[0],Tcl[i].iloc[0],Tcl[i].iloc[1]]
-            vaporationFlux = [evaporationFlux[i].iloc[0],evaporationFlux[i].iloc[0],evaporationFlux[i].iloc[1]]
+            clothTemp = [Tcl[i][0],Tcl[i][0],Tcl[i][1]]
+            vaporationFlux = [evaporationFlux[i][0],evaporationFlux[i][0],evaporationFlux[i][1]]
         else:
-            clothTemp = [Tcl[i].iloc[0],Tcl[i].iloc[1]]
-            vaporationFlux = [evaporationFlux[i].iloc[0],evaporationFlux[i].iloc[1]]
-        df.insert(loc=len(df.columns),column='Tcl'+sectionsJOS3[i]+'(C)',value=clothTemp)
-        df.insert(loc=len(df.columns),column='mEvap'+sectionsJOS3[i]+'(kg/m^2-s)',value=vaporationFlux)
+            clothTemp = [Tcl[i][0],Tcl[i][1]]
+            vaporationFlux = [evaporationFlux[i][0],evaporationFlux[i][1]]
+        table['Tcl'+sectionsJOS3[i]+'(C)'] = clothTemp
+        table['mEvap'+sectionsJOS3[i]+'(kg/m^2-s)'] = vaporationFlux
         
-    return df
+    return table
 
+class MonitorBuffer:
+    """
+    Ring buffer of the most recent rows of the CFD monitor export with time-weighted window means.
     
+    Every sample is weighted with the time step it closes (the time since the previous row), so the
+    averages are taken over physical time and stay correct for variable time steps, e.g. the 0.25 s
+    steps with frozen flow. Rows older than span before the last row are overwritten, except the row
+    at the start of the window.
+    """
+    def __init__(self,columns,span,capacity=64):
+        self.span = span
+        self.data = np.empty((capacity,columns))
+        self.first = 0 # position of the oldest row
+        self.size = 0
+        
+    @property
+    def last(self):
+        return self.data[(self.first+self.size-1)%len(self.data)]
+        
+    def push(self,rows):
+        """
+        Add rows (time in the first column), oldest first
+        """
+        if self.size+len(rows)>len(self.data):
+            self._grow(self.size+len(rows))
+        self.data[(self.first+self.size+np.arange(len(rows)))%len(self.data)] = rows
+        self.size += len(rows)
+        
+        ## Release the rows before the window
+        time = self.data[self._order(),0]
+        drop = max(np.searchsorted(time,time[-1]-self.span,side='right')-1,0)
+        self.first = (self.first+drop)%len(self.data)
+        self.size -= drop
+        
+    def means(self,columns,span,dtFirst):
+        """
+        Time-weighted means of the columns (index array of any shape) over the last span seconds.
+        dtFirst is the time step of the oldest row if the window reaches back to it.
+        """
+        rows = self.data[self._order()]
+        time = rows[:,0]
+        start = time[-1]-span
+        i = np.searchsorted(time,start,side='right')
+        previous = time[i-1] if i>0 else time[0]-dtFirst
+        steps = np.concatenate(([previous],time[i:]))
+        weights = np.diff(np.maximum(steps,start))
+        return np.tensordot(weights,rows[i:][:,columns],axes=1)/weights.sum()
+        
+    def _order(self):
+        return (self.first+np.arange(self.size))%len(self.data)
+    
+    def _grow(self,size):
+        data = np.empty((max(size,2*len(self.data)),self.data.shape[1]))
+        data[:self.size] = self.data[self._order()]
+        self.data = data
+        self.first = 0
 
-
-if __name__=='__main__':
+class MonitorReader:
+    """
+    Incremental reader for the monitor export of STAR-CCM+ (monitorData.csv).
     
-    try:
-        ## If the files are present, then load the CFD data and body temperature data        
-        file=pd.read_csv('monitorData.csv')
-        Driver.bodytemp=np.load('bodytempDriver.npy')        
-        historyDriver=pd.read_csv('driver.csv')        
-        print('Loaded data from CFD')
-    except:
-        ## If not, initialize the simulation with conditions: (model,Ta,va,Tr,RH,time(min)), save the skin temperature and bodytemp; exit
-        print('Setting initial skin temperatures')
-        Driver=InitSolution(Driver,ambTemp,0,radTemp,ambRH,soakTime)        
-        WriteToCSVForCFD(Driver,'driver',1,None)        
-        np.save('bodytempDriver.npy',Driver.bodytemp)        
-        sys.exit()
+    The export rewrites the complete history every coupling step. The reader remembers the byte offset
+    of the previous read and parses only the rows appended since then into a MonitorBuffer holding the
+    last span seconds needed for the time averages. If the header changes, the file shrinks or the rows
+    before the offset are not the ones read before, the last span seconds are read again from the end of the file.
+    """
+    def __init__(self,path='monitorData.csv',span=1):
+        self.path = path
+        self.span = span
+        self.header = None
+        self.rows = 0 # rows parsed since the last resync
+        self._headerLine = None
+        self._columnMap = None
+        self._offset = 0
+        self._lastLine = b''
+        self.buffer = None
+        
+    def read(self,span=None):
+        """
+        Return the MonitorBuffer with the last span seconds, the column names are in header
+        """
+        if span is not None and span>self.span:
+            ## The rows dropped from the buffer are needed again
+            self.span = span
+            self.header = None
+        
+        with open(self.path,'rb') as f:
+            headerLine = f.readline()
+            size = os.fstat(f.fileno()).st_size
+            if (self.header is None or headerLine!=self._headerLine or size<self._offset
+                or not self._samePrefix(f)):
+                self._resync(f,headerLine,size)
+            else:
+                f.seek(self._offset)
+                self._append(f.read())
+                
+        return self.buffer
+    
+    def columnMap(self):
+        """
+        Column map of the current header (compiled again only when the header changes)
+        """
+        if self._columnMap is None:
+            self._columnMap = MonitorColumns(self.header)
+        return self._columnMap
+    
+    def _samePrefix(self,f):
+        """
+        Check that the last row read before is still in place
+        """
+        f.seek(self._offset-len(self._lastLine))
+        return f.read(len(self._lastLine))==self._lastLine
+    
+    def _resync(self,f,headerLine,size):
+        """
+        Read the header and the rows of the last span seconds from the end of the file
+        """
+        start = len(headerLine)
+        pos = size
+        block = b''
+        while pos>start:
+            step = min(65536,pos-start)
+            pos -= step
+            f.seek(pos)
+            block = f.read(step)+block
+            lines = [line for line in block.splitlines()[1:] if line.strip()] # the first row may be partial
+            if len(lines)>1 and float(lines[0].split(b',',1)[0])<=float(lines[-1].split(b',',1)[0])-self.span:
+                break
+        if pos>start:
+            block = block[block.find(b'\n')+1:] # drop the partial first row
+        
+        if headerLine!=self._headerLine:
+            self._columnMap = None
+        self.header = next(csv.reader([headerLine.decode().strip()]))
+        self.rows = 0
+        self._headerLine = headerLine
+        self._offset = size-len(block)
+        self._lastLine = b''
+        self.buffer = MonitorBuffer(len(self.header),self.span)
+        self._append(block)
+        
+    def _append(self,chunk):
+        """
+        Parse the complete rows in chunk and add them to the buffer
+        """
+        end = chunk.rfind(b'\n')+1
+        if end==0:
+            return
+        lines = chunk[:end].split(b'\n')[:-1]
+        self._offset += end
+        self._lastLine = lines[-1]+b'\n'
+        
+        rows = [line.decode().split(',') for line in lines if line.strip()]
+        if rows:
+            self.buffer.push(np.array(rows,dtype=float))
+            self.rows += len(rows)
 
-    ## Rename CFD file columns
-    file = RenameColumnsCFD(file)
-    columns = file.columns
+def LoadState(model,monitorReader,driverFile,dtCFD):
+    """
+    Load the CFD monitor data, the body temperatures and the last driver row of the previous coupling step
+    """
+    file=monitorReader.read(monitorSpan)
+    model.bodytemp=np.load('bodytempDriver.npy')
+    driverFile.load()
+    return file
 
-    # Set dictionaries for appropriate sections for air temperature, RH, heatFlux and operating temperatures
-    tempLocalDriver = {}
-    RHLocalDriver = {}
-    heatFluxLocalDriver = {}
-    toLocalDriver = {}
-    
-    if file[columns[0]].iloc[-1]>1.5:
+def InitialStep(model,driverFile):
+    """
+    Initialize the simulation with conditions: (model,Ta,va,Tr,RH,time(min)), save the skin temperature and bodytemp
+    """
+    print('Setting initial skin temperatures')
+    model=InitSolution(model,ambTemp,0,radTemp,ambRH,None if soakSteady else soakTime)
+    WriteToCSVForCFD(model,driverFile,1)
+    np.save('bodytempDriver.npy',model.bodytemp)
+
+def CouplingStep(model,columnMap,file,driverFile,dtCFD):
+    """
+    Advance the human model by one coupling step with the CFD monitor data (MonitorBuffer with the columns
+    of columnMap) and write the boundary conditions for CFD
+    """
+    if file.last[columnMap.time]>1.5:
         factor = 2
     else:
         factor = 1
     
-    for col in file.columns:
-        if col[:18]=='Temp_human.Driver_':
-            tempLocalDriver[col[18:]]=file[col].rolling(int(dt/dtCFD)).mean().iloc[-1]-273.15                
-        elif col[:16]=='RH_human.Driver_':
-            RHLocalDriver[col[16:]]=file[col].rolling(int(dt/dtCFD)).mean().iloc[-1]     
-        elif col[:22]=='heatFlux_human.Driver_':
-            heatFluxLocalDriver[col[22:]]=file[col].rolling(int(dt/dtCFD)*factor).mean().iloc[-1]
-        elif col[:16]=='To_human.Driver_':
-            toLocalDriver[col[16:]] = file[col].rolling(int(dt/dtCFD)).mean().iloc[-1]-273.15
-        
-    ## Create lists of corresponding quantities in the right order
-    taDriver = []
-    rhDriver = []
-    heatFluxDriver = []
-    toDriver = []
-
-    for val in sectionsJOS3:
-        taDriver.append(tempLocalDriver[corrDictJOSToBerk[val]])
-        rhDriver.append(RHLocalDriver[corrDictJOSToBerk[val]])
-        heatFluxDriver.append(heatFluxLocalDriver[corrDictJOSToBerk[val]])
-        toDriver.append(toLocalDriver[corrDictJOSToBerk[val]])
+    ## Time averages of the air temperature, RH, heatFlux and operating temperatures in sectionsJOS3 order
+    taDriver,rhDriver,_,toDriver = file.means(columnMap.index,dt,dtCFD)
+    heatFluxDriver = file.means(columnMap.index[2],dt*factor,dtCFD)
+    taDriver = taDriver-273.15
+    toDriver = toDriver-273.15
     
     Tcl=[]
     for i in range(len(sectionsJOS3)):
-        Tcl.append(historyDriver['Tcl'+sectionsJOS3[i]+'(C)'].iloc[-1])
+        Tcl.append(driverFile.last['Tcl'+sectionsJOS3[i]+'(C)'])
     
     ## Update conditions are the next timestep:
-    Driver.Ta=taDriver    
-    Driver.RH = rhDriver
-    Driver._to = np.array(toDriver)
+    model.Ta=taDriver    
+    model.RH = rhDriver
+    model._to = toDriver
        
     ## Compute the overall thermal resistance between air and the skin
-    r_t = abs((np.array(Tcl)-Driver._to)/np.array(heatFluxDriver))+Driver.Icl*0.155
-    Driver._rt = r_t
+    r_t = abs((np.array(Tcl)-model._to)/heatFluxDriver)+model.Icl*0.155
+    model._rt = r_t
 
     ## Set the heat transfer coefficient for estimations of evaporative resistance
-    Driver._hc = 1/abs((np.array(Tcl)-Driver._to)/np.array(heatFluxDriver)) 
+    model._hc = 1/abs((np.array(Tcl)-model._to)/heatFluxDriver) 
 
     
     print('Computing new skin temperatures...')
     ## simulate the human
-    Driver.simulate(1,dt)    
+    model.simulate(1,dt)    
     print('done')
 
     ## Write to disc for next iteration    
     print('Updating file...')
-    WriteToCSVForCFD(Driver,'driver',0,historyDriver)    
-    np.save('bodytempDriver.npy',Driver.bodytemp)
-        
+    WriteToCSVForCFD(model,driverFile,0)    
+    np.save('bodytempDriver.npy',model.bodytemp)
+
+def Serve():
+    """
+    Persistent coupling mode: the human model, its setpoints and the driver history stay in memory
+    and one coupling step is computed per request read from stdin.
+
+    Requests (one per line):
+        step <dtCFD>  advance one coupling step with the latest monitorData.csv
+        ping          check that the server is alive
+        quit          stop the server
+    Every request is answered by the log lines of the step followed by a line
+    'END ok <time(s)>', 'END error <message>' or 'END bye'.
+    """
+    sys.stdout.reconfigure(line_buffering=True)
+    monitorReader = MonitorReader('monitorData.csv',monitorSpan)
+    driverFile = DriverFile('driver')
+    
+    for line in sys.stdin:
+        request = line.split()
+        if not request:
+            continue
+        try:
+            if request[0]=='quit':
+                print('END bye')
+                break
+            elif request[0]=='ping':
+                print('END ok')
+            elif request[0]=='step':
+                dtStep = float(request[1]) if len(request)>1 else dtCFD
+                if driverFile.last is None:
+                    ## First request: continue from the files on disc if present, otherwise initialize
+                    try:
+                        file = LoadState(Driver,monitorReader,driverFile,dtStep)
+                        print('Loaded data from CFD')
+                    except Exception:
+                        InitialStep(Driver,driverFile)
+                        print('END ok', driverFile.last['time(s)'])
+                        continue
+                else:
+                    file = monitorReader.read(monitorSpan)
+                CouplingStep(Driver,monitorReader.columnMap(),file,driverFile,dtStep)
+                print('END ok', driverFile.last['time(s)'])
+            else:
+                print('END error unknown request '+request[0])
+        except Exception as e:
+            print('END error', repr(e))
+
+
+def ReportStartup():
+    """
+    Print the import and set up times recorded by StartupMark and compare them with startupBudget
+    """
+    total = sum(startupTimes.values())
+    for label,seconds in startupTimes.items():
+        print('{:<8s}{:8.3f} s'.format(label,seconds))
+    print('{:<8s}{:8.3f} s (budget {:.3f} s)'.format('total',total,startupBudget))
+    print('pandas imported:', 'pandas' in sys.modules)
+    return total<=startupBudget
+
+
+if __name__=='__main__':
+    
+    if '--profile-startup' in sys.argv[1:]:
+        sys.exit(0 if ReportStartup() else 1)
+    
+    if '--server' in sys.argv[1:]:
+        Serve()
+        sys.exit()
+    
+    driverFile = DriverFile('driver')
+    monitorReader = MonitorReader('monitorData.csv',monitorSpan)
+    try:
+        ## If the files are present, then load the CFD data and body temperature data        
+        file = LoadState(Driver,monitorReader,driverFile,dtCFD)
+        print('Loaded data from CFD')
+    except:
+        ## If not, initialize the simulation, save the skin temperature and bodytemp; exit
+        InitialStep(Driver,driverFile)
+        sys.exit()
 
+    CouplingStep(Driver,monitorReader.columnMap(),file,driverFile,dtCFD)
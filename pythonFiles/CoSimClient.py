@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Client for the persistent coupling mode of CoSim.py ('python3 CoSim.py --server').
+
+The server is started once and keeps the human model in memory; every call to
+step() advances it by one coupling interval. ThermRegCtrl.java speaks the same
+line protocol, this client is the stand-in for tests and scripted runs.
+ -Execute with 'python3 CoSimClient.py <dtCFD> <number of coupling steps>'
+
+"""
+
+import subprocess
+import sys
+import os
+
+
+class CoSimClient:
+    """
+    Starts 'CoSim.py --server' and exchanges one request/response per coupling step
+    """
+    def __init__(self,script='CoSim.py',python=sys.executable,cwd=None):
+        self._process = subprocess.Popen([python,script,'--server'],cwd=cwd,
+                                         stdin=subprocess.PIPE,stdout=subprocess.PIPE,
+                                         text=True,bufsize=1)
+
+    def request(self,line):
+        """
+        Send one request and return (status, values, log lines) from the server
+        """
+        self._process.stdin.write(line+'\n')
+        self._process.stdin.flush()
+        log = []
+        for out in self._process.stdout:
+            if out.startswith('END'):
+                reply = out.split()
+                return reply[1], reply[2:], log
+            log.append(out.rstrip('\n'))
+        raise RuntimeError('CoSim server terminated:\n'+'\n'.join(log))
+
+    def step(self,dtCFD):
+        """
+        Advance the human model by one coupling step and return the time of the new CFD boundary conditions
+        """
+        status, values, log = self.request('step '+str(dtCFD))
+        if status != 'ok':
+            raise RuntimeError(' '.join(values)+'\n'+'\n'.join(log))
+        return float(values[0])
+
+    def close(self):
+        if self._process.poll() is None:
+            self.request('quit')
+            self._process.stdin.close()
+            self._process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+
+if __name__=='__main__':
+    
+    try:
+        dtCFD = float(sys.argv[1])
+    except:
+        dtCFD = 0.05 #s
+    try:
+        steps = int(sys.argv[2])
+    except:
+        steps = 1
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),'CoSim.py')
+    with CoSimClient(script) as client:
+        for i in range(steps):
+            print('time(s):',client.step(dtCFD))
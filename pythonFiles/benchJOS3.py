@@ -0,0 +1,171 @@
+"""
+Benchmark of the linear solvers of JOS3: cost per time step, cost of the solve alone,
+share of the steps reusing a factorization and agreement of the body temperatures
+with the explicit inverse of the original code. With batch, the time per step of
+JOS3Batch against a loop over JOS3 models for several numbers of bodies. With
+integrator, the error of large time steps of the backward Euler and exponential
+integrators against backward Euler steps of 1 s, in a slowly cooling environment.
+With threads, models with rate-limited shivering run interleaved in a thread pool
+must give bit-identical body temperatures to sequential runs.
+
+    python benchJOS3.py [steps] [dtime]
+    python benchJOS3.py batch [bodies ...]
+    python benchJOS3.py integrator [dtime ...]
+    python benchJOS3.py threads [models] [workers]
+"""
+import os
+import sys
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+# The jos3.py next to this script would shadow the installed jos3 package
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path = [path for path in sys.path if os.path.abspath(path or '.')!=here]
+import jos3
+
+solvers = {'inv':{'solver':'inv'},
+           'lu':{'solver':'lu'},
+           'banded':{'solver':'banded'},
+           'lu+reuse':{'solver':'lu','reuse_tol':1e-2},
+           'banded+reuse':{'solver':'banded','reuse_tol':1e-2}}
+
+def CreateModel(settings):
+    """
+    Model in a cold environment, so the thermoregulation is active
+    """
+    model = jos3.JOS3(height=1.8,weight=75,age=30,**settings)
+    model.Ta = 5
+    model.Tr = 5
+    model.RH = 50
+    model.Va = 0.5
+    model.Icl = 1.0
+    model.PAR = 1.6
+    return model
+
+def SolveTime(model,number=2000):
+    """
+    Time of a single solve of the last heat balance of model [s]
+    """
+    systems = []
+    solve = model._solve
+    model._solve = lambda arrA,arr: systems.append((arrA,arr)) or solve(arrA,arr)
+    model.simulate(1,1)
+    del model._solve
+    arrA,arr = systems[-1]
+    return min(timeit.repeat(lambda: model._solve(arrA,arr),number=number,repeat=3))/number
+
+def Benchmark(steps=600,dtime=1):
+    results = {}
+    for solver,settings in solvers.items():
+        try:
+            model = CreateModel(settings)
+        except ImportError:
+            print('{:<14s} not available (scipy is missing)'.format(solver))
+            continue
+        start = time.perf_counter()
+        temps = []
+        for i in range(steps):
+            model.simulate(1,dtime,output=False)
+            temps.append(model.bodytemp)
+        elapsed = (time.perf_counter()-start)/steps
+        reuse = model.reuse_rate
+        results[solver] = (elapsed,SolveTime(model),reuse,np.array(temps))
+
+    reference = results['inv'][3]
+    print('{:<14s}{:>12s}{:>12s}{:>8s}{:>14s}'.format('solver','step (ms)','solve (us)','reuse','max dT (K)'))
+    for solver,(step,solve,reuse,temps) in results.items():
+        print('{:<14s}{:12.3f}{:12.1f}{:8.2f}{:14.2e}'.format(solver,step*1e3,solve*1e6,reuse,
+                                                             abs(temps-reference).max()))
+    return results
+
+def BenchmarkBatch(bodies=(1,10,100,500),steps=20,dtime=60):
+    print('{:<8s}{:>12s}{:>12s}{:>10s}'.format('bodies','loop (ms)','batch (ms)','speedup'))
+    for num in bodies:
+        models = [CreateModel({}) for i in range(num)]
+        for i,model in enumerate(models):
+            model.PAR = 1.2+i/num
+        batch = jos3.JOS3Batch(models)
+        start = time.perf_counter()
+        batch.simulate(steps,dtime,output=False)
+        elapsed = (time.perf_counter()-start)/steps
+        looped = models[:50] # The loop scales linearly with the bodies
+        start = time.perf_counter()
+        for model in looped:
+            model.simulate(steps,dtime,output=False)
+        loop = (time.perf_counter()-start)/steps*num/len(looped)
+        print('{:<8d}{:12.2f}{:12.2f}{:10.1f}'.format(num,loop*1e3,elapsed*1e3,loop/elapsed))
+
+def RunCooling(dtime,duration=7200,**settings):
+    """
+    Body temperatures after every step of dtime [s] from the steady state at To=28,
+    with To falling by 6 K in the first hour
+    """
+    model = jos3.JOS3(height=1.8,weight=75,age=30,**settings)
+    model.To = 28
+    model.solve_steady(output=False)
+    start = time.perf_counter()
+    temps = []
+    for i in range(int(duration/dtime)):
+        model.To = 28-6*min(i*dtime/3600,1)
+        model.simulate(1,dtime,output=False)
+        temps.append(model.bodytemp)
+    elapsed = time.perf_counter()-start
+    return np.array(temps),elapsed/duration*3600,model
+
+def BenchmarkIntegrator(dtimes=(60,300,600,1200)):
+    reference = RunCooling(1)[0]
+    print('{:<8s}{:<13s}{:>12s}{:>12s}{:>14s}{:>13s}'.format('dtime','integrator','ms per h','max dT (K)','final dT (K)','propagators'))
+    for dtime in dtimes:
+        fine = reference[int(dtime)-1::int(dtime)]
+        for integrator in ('euler','exponential'):
+            try:
+                temps,elapsed,model = RunCooling(dtime,integrator=integrator)
+            except ImportError:
+                print('{:<8g}{:<13s} not available (scipy is missing)'.format(dtime,integrator))
+                continue
+            print('{:<8g}{:<13s}{:12.1f}{:12.3f}{:14.4f}{:13d}'.format(dtime,integrator,elapsed*1e3,
+                  abs(temps-fine).max(),abs(temps[-1]-fine[-1]).max(),model.solver_stats['propagators']))
+
+def RunShivering(i,steps=300,dtime=10):
+    """
+    Body temperatures after every step of a model with rate-limited shivering in the cold,
+    the environment differs by model i
+    """
+    model = CreateModel({})
+    model.options['limit_dshiv/dt'] = True
+    model.Ta = model.Tr = 2+i
+    temps = []
+    for step in range(steps):
+        model.simulate(1,dtime,output=False)
+        temps.append(model.bodytemp)
+        time.sleep(0) # Let the other threads step in between
+    return np.array(temps)
+
+def BenchmarkThreads(num=8,workers=4):
+    start = time.perf_counter()
+    sequential = [RunShivering(i) for i in range(num)]
+    elapsed = time.perf_counter()-start
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        threaded = list(pool.map(RunShivering,range(num)))
+    elapsed_threads = time.perf_counter()-start
+    identical = all(np.array_equal(a,b) for a,b in zip(sequential,threaded))
+    print('{} models, sequential {:.2f} s, {} threads {:.2f} s, bit-identical: {}'.format(
+          num,elapsed,workers,elapsed_threads,identical))
+    return identical
+
+
+if __name__=='__main__':
+    if sys.argv[1:2]==['batch']:
+        BenchmarkBatch([int(num) for num in sys.argv[2:]] or (1,10,100,500))
+        sys.exit()
+    if sys.argv[1:2]==['threads']:
+        identical = BenchmarkThreads(*[int(arg) for arg in sys.argv[2:4]])
+        sys.exit(0 if identical else 1)
+    if sys.argv[1:2]==['integrator']:
+        BenchmarkIntegrator([float(dtime) for dtime in sys.argv[2:]] or (60,300,600,1200))
+        sys.exit()
+    steps = int(sys.argv[1]) if len(sys.argv)>1 else 600
+    dtime = float(sys.argv[2]) if len(sys.argv)>2 else 1
+    Benchmark(steps,dtime)
@@ -1,7 +1,12 @@
 # -*- coding: utf-8 -*-
 import csv
 import datetime as dt
+import hashlib
+import itertools
 import os
+import threading
+import time
+from collections import OrderedDict
 
 import numpy as np
 # Import from relative path
@@ -24,6 +29,66 @@ except ImportError:
     from jos3.construction import _BSAst
     from jos3.params import ALL_OUT_PARAMS, show_outparam_docs
 
+# Indices of the layers as arrays, the scatter targets of JOS3._run
+_INDEX = {key: np.array(index) for key, index in INDEX.items()}
+_VINDEX = {key: np.array(index) for key, index in VINDEX.items()}
+# Nodes of the thermogenesis of core, muscle, fat and skin
+_QNODES = np.concatenate([_INDEX["core"], _INDEX["muscle"], _INDEX["fat"], _INDEX["skin"]])
+# threg.shivering keeps the state of its rate limiter in threg.PRE_SHIV,
+# every JOS3 swaps in its own state under this lock
+_SHIV_LOCK = threading.Lock()
+# Output parameters of every recorded step of JOS3._run
+_OUTPUTS = ("CycleTime", "ModTime", "dt", "TskMean", "Tsk", "Tcr", "WetMean", "Wet", "Wle",
+            "CO", "Met", "RESsh", "RESlh", "SHLsk", "LHLsk", "wESweat")
+# Detailed output parameters (ex_output) by the intermediate of JOS3._run
+# they are taken from and the selected nodes or segments, see _Detail
+_DETAILS = {
+    "Name": ("name", None),
+    "Height": ("height", None),
+    "Weight": ("weight", None),
+    "BSA": ("bsa", None),
+    "Fat": ("fat", None),
+    "Sex": ("sex", None),
+    "Age": ("age", None),
+    "Setptcr": ("setpt_cr", None),
+    "Setptsk": ("setpt_sk", None),
+    "Tcb": ("bodytemp", 0),
+    "Tar": ("bodytemp", _INDEX["artery"]),
+    "Tve": ("bodytemp", _INDEX["vein"]),
+    "Tsve": ("bodytemp", _INDEX["sfvein"]),
+    "Tms": ("bodytemp", _INDEX["muscle"]),
+    "Tfat": ("bodytemp", _INDEX["fat"]),
+    "To": ("to", None),
+    "Rt": ("r_t", None),
+    "Ret": ("r_et", None),
+    "Ta": ("ta", None),
+    "Tr": ("tr", None),
+    "RH": ("rh", None),
+    "Va": ("va", None),
+    "PAR": ("par", None),
+    "Icl": ("clo", None),
+    "Esk": ("e_sk", None),
+    "Emax": ("e_max", None),
+    "Esweat": ("e_sweat", None),
+    "BFcr": ("bf_cr", None),
+    "BFms": ("bf_ms", _VINDEX["muscle"]),
+    "BFfat": ("bf_fat", _VINDEX["fat"]),
+    "BFsk": ("bf_sk", None),
+    "BFava_hand": ("bf_ava_hand", None),
+    "BFava_foot": ("bf_ava_foot", None),
+    "Mbasecr": ("mbase_cr", None),
+    "Mbasems": ("mbase_ms", _VINDEX["muscle"]),
+    "Mbasefat": ("mbase_fat", _VINDEX["fat"]),
+    "Mbasesk": ("mbase_sk", None),
+    "Mwork": ("mwork", None),
+    "Mshiv": ("mshiv", None),
+    "Mnst": ("mnst", None),
+    "Qcr": ("qcr", None),
+    "Qms": ("qms", _VINDEX["muscle"]),
+    "Qfat": ("qfat", _VINDEX["fat"]),
+    "Qsk": ("qsk", None),
+    }
+
 
 class JOS3():
     """
@@ -58,7 +123,53 @@ class JOS3():
     ex_output : None, list or "all", optional
         If you want to get extra output parameters, set the parameters as the list format.
         If ex_output is "all", all parameters are output.
+        The extra parameters are derived from the recorded steps when the
+        results are read, e.g. by dict_results or to_csv.
         The default is None.
+    setpt_cache : None, True or SetptCache, optional
+        Reuse the setpoint temperatures of a body with the same anthropometrics
+        instead of solving them again. If True, the module cache SETPT_CACHE is used.
+        The default is None (always solve).
+    solver : str, optional
+        Linear solver of the heat balance of a time step:
+        "lu" (dense LU factorization), "banded" (band LU of the sparse
+        system in a bandwidth-reducing node order, requires scipy) or
+        "inv" (explicit inverse of the original code, for reference).
+        The default is "lu".
+    reuse_tol : float, optional
+        Reuse the LU factorization of the heat balance while the matrix
+        differs from the factorized one by less than this relative 1-norm,
+        correcting the solution by iterative refinement (requires scipy).
+        The matrix is factorized again when the drift is larger or the
+        refinement needs more than 2 sweeps, and a step that failed
+        lowers the drift tried next. solver_stats counts the solves.
+        With 85 nodes a reused solve with 2 sweeps costs about as much as
+        a new factorization (50 vs 40 us banded, 75 vs 69 us lu), so the
+        reuse only pays off where the matrix barely changes: in the cold
+        case of benchJOS3 at dtime=1 (reuse_tol=1e-2, 40 % of the steps
+        reused) banded+reuse takes 0.35 ms per step as banded, lu+reuse
+        0.44 ms against 0.38 ms for lu.
+        The default is None (factorize every step).
+    integrator : str, optional
+        Time integration of the heat balance: "euler" (backward Euler, the
+        original code) or "exponential" (exact solution of the step with the
+        thermoregulation and the heat transfer coefficients frozen over
+        dtime, requires scipy). It removes the time discretization error of
+        the heat balance only, the frozen heat sources keep most of the
+        error of large steps: in the cooling case of benchJOS3 the maximum
+        error at dtime=600 is 0.87 K against 1.1 K for euler (final error
+        0.12 vs 0.34 K), at about 2.5 times the cost per step.
+        The default is "euler".
+    propagator_tol : float, optional
+        With integrator="exponential", reuse the propagator (matrix
+        exponential) of the heat balance while the matrix differs from the
+        one of the propagator by less than this relative 1-norm. The steady
+        state of every step is solved exactly, only its transient uses the
+        reused propagator. The default is 1e-3 (0 reuses only an unchanged
+        matrix).
+    max_history : int, optional
+        Keep only the output parameters of the last max_history steps
+        (see History). The default is None (all steps).
 
 
     Setter & Getter
@@ -180,6 +291,12 @@ class JOS3():
             bmr_equation="harris-benedict",
             bsa_equation="dubois",
             ex_output=None,
+            setpt_cache=None,
+            solver="lu",
+            reuse_tol=None,
+            integrator="euler",
+            propagator_tol=1e-3,
+            max_history=None,
             ):
 
         self._height = height
@@ -202,10 +319,35 @@ class JOS3():
         self._cdt = cons.conductance(height, weight, bsa_equation, fat,)
         # Thermal capacity [J/K]
         self._cap = cons.capacity(height, weight, bsa_equation, age, ci)
+        # Values depending only on the body, posture or dtime, see _precompute
+        self._pre = {}
+        self._conv = None  # State and convective heat transfer coefficient of the last call
+        # Linear solver of the heat balance
+        if solver not in ("lu", "banded", "inv"):
+            raise ValueError('solver must be "lu", "banded" or "inv".')
+        self._solver = solver
+        self._band = _BandSolver(self._cdt) if solver == "banded" else None
+        if reuse_tol is not None and solver == "lu":
+            import scipy.linalg  # Fails early if scipy is missing
+        self._reuse_tol = reuse_tol
+        self._reuse_limit = reuse_tol  # Drift up to which a reuse is tried
+        self._factor = None  # Matrix, norm and solver of the last factorization
+        self.solver_stats = {"solves": 0, "reused": 0, "factorized": 0, "refinements": 0,
+                             "propagators": 0}
+        # Time integration of the heat balance
+        if integrator not in ("euler", "exponential"):
+            raise ValueError('integrator must be "euler" or "exponential".')
+        if integrator == "exponential":
+            import scipy.linalg  # Fails early if scipy is missing
+        self._integrator = integrator
+        self._propagator_tol = propagator_tol
+        self._propagator = None  # Matrix, norm and propagator of the last matrix exponential
 
         # Set point temp [oC]
         self.setpt_cr = np.ones(17)*37  # core
         self.setpt_sk = np.ones(17)*34  # skin
+        self.setpt_report = None  # Convergence of the setpoint calculation
+        self.soak_report = None  # Convergence of the last steady soak
 
         # Initial body temp [oC]
         self._bodytemp = np.ones(NUM_NODES) * 36
@@ -236,23 +378,33 @@ class JOS3():
                 "bat_positive": False,
                 "ava_zero": False,
                 "shivering": False,}
-        threg.PRE_SHIV = 0 # reset
-        self._history = []
+        self._pre_shiv = 0 # Previous shivering thermogenesis [W]
+        self._history = History(max_history)
+        self._schema = None  # Shapes and column titles of the results
+        self._writer = None  # Attached ResultWriter
         self._t = dt.timedelta(0) # Elapsed time
         self._cycle = 0 # Cycle time
         self._seatHeater = None
         self._seatHeat = 0.
         # Reset setpoint temperature
-        dictout = self._reset_setpt()
+        if setpt_cache is True:
+            setpt_cache = SETPT_CACHE
+        dictout = self._reset_setpt(cache=setpt_cache)
         self._history.append(dictout)  # Save the last model parameters
 
 
-    def _reset_setpt(self):
+    def _reset_setpt(self, cache=None):
         """
         Reset setpoint temperature by steady state calculation.
         Be careful, input parameters (Ta, Tr, RH, Va, Icl, PAR) and body
         tempertures are also resetted.
 
+        Parameters
+        ----------
+        cache : SetptCache, optional
+            If the body is in the cache, only the last steady iteration is
+            calculated to rebuild the model parameters. The default is None.
+
         Returns
         -------
         Parameters of JOS-3 : dict
@@ -269,20 +421,339 @@ class JOS3():
 
         # Steady-calculation
         self.options["ava_zero"] = True
-        for t in range(10):
-            dictout = self._run(dtime=60000, passive=True)
+        entry = None
+        if cache is not None:
+            key = cache.key(self)
+            entry = cache.get(key)
+        if entry is None:
+            dictout, self.setpt_report, bodytemp = self._solve_steady(passive=True)
+        else:
+            self._bodytemp = entry["bodytemp"].copy()
+            dictout = self._run(dtime=60000, passive=True, steady=True)
+            self.setpt_report = None
 
         # Set new setpoint temperatures
-        self.setpt_cr = self.Tcr
-        self.setpt_sk = self.Tsk
+        if entry is None:
+            self.setpt_cr = self.Tcr
+            self.setpt_sk = self.Tsk
+            if cache is not None:
+                cache.put(key, {"bodytemp": bodytemp,
+                                "setpt_cr": self.setpt_cr.copy(),
+                                "setpt_sk": self.setpt_sk.copy()})
+        else:
+            self.setpt_cr = entry["setpt_cr"].copy()
+            self.setpt_sk = entry["setpt_sk"].copy()
         self.options["ava_zero"] = False
 
         return dictout
 
 
-    def simulate(self, times, dtime=60, output=True):
+    def solve_steady(self, tol=1e-6, max_iter=50, output=True):
+        """
+        Solve the steady state of the body temperatures under the current
+        input conditions. The thermoregulation and the steady heat balance
+        are iterated until the body temperatures change less than tol.
+
+        Parameters
+        ----------
+        tol : float, optional
+            Largest change of the body temperatures in the last iteration
+            to stop [oC]. The default is 1e-6.
+        max_iter : int, optional
+            Maximum number of iterations. The default is 50.
+        output : bool, optional
+            If you don't record paramters, set False. The default is True.
+
+        Returns
+        -------
+        report : dict
+            "converged" (bool), "iterations" (int) and "residual", the
+            largest change of the body temperatures in the last iteration [oC].
+
+        Examples
+        -------
+        >>> model = jos3.JOS3()
+        >>> model.To = 20
+        >>> model.solve_steady()
+        {'converged': True, 'iterations': 18, 'residual': 2.9e-08}
+        """
+        dictout, report, _ = self._solve_steady(tol=tol, max_iter=max_iter, output=output)
+        if output:
+            self._cycle += 1
+            self._history.append(dictout)
+            if self._writer is not None:
+                self._writer._simulated(self)
+        return report
+
+
+    def _solve_steady(self, tol=1e-6, max_iter=50, passive=False, output=True, memory=5):
+        """
+        Iterate the steady heat balance.
+        The fixed point of the thermoregulation and the steady heat balance
+        is accelerated by Anderson mixing of the last iterations, which
+        also converges when the thermoregulatory responses are too strong
+        for a plain fixed-point iteration.
+
+        Returns
+        -------
+        dictout : dictionary
+            Output parameters of the last iteration.
+        report : dict
+            Convergence report, see solve_steady.
+        bodytemp : numpy.ndarray (85,)
+            Body temperatures before the last iteration.
+        """
+        x = self._bodytemp.copy()
+        x_prev = f_prev = None
+        arr_dx, arr_df = [], []
+        for i in range(max_iter):
+            bodytemp = x
+            self._bodytemp = x.copy()
+            dictout = self._run(dtime=60000, passive=passive, output=output, steady=True)
+            f = self._bodytemp - x
+            residual = np.abs(f).max()
+            if residual < tol or not np.isfinite(residual):
+                break
+
+            # Anderson mixing
+            if f_prev is not None:
+                arr_dx.append(x - x_prev)
+                arr_df.append(f - f_prev)
+                if len(arr_dx) > memory:
+                    del arr_dx[0], arr_df[0]
+            x_prev, f_prev = x, f
+            if arr_dx:
+                dx = np.array(arr_dx).T
+                df = np.array(arr_df).T
+                gamma = np.linalg.lstsq(df, f, rcond=None)[0]
+                x = x + f - np.dot(dx + df, gamma)
+            else:
+                x = x + f
+        report = {"converged": bool(residual < tol), "iterations": i + 1,
+                  "residual": float(residual)}
+        return dictout, report, bodytemp
+
+
+    def soak(self, time=None, library=None):
+        """
+        Soak the body under the current input conditions in one step of
+        time [sec], or to the steady state if time is None.
+        The soaked state is recorded like simulate() does.
+
+        Parameters
+        ----------
+        time : int or float, optional
+            Soak time [sec]. The default is None (steady state).
+        library : SoakLibrary, optional
+            Reuse the soaked state of an earlier soak with the same body,
+            initial state and input conditions. The default is None.
+
+        Returns
+        -------
+        bool
+            True if the soaked state was taken from the library.
+        """
+        entry = key = None
+        if library is not None and self._cacheable():
+            key = library.key(self, time)
+            entry = library.get(key)
+
+        if time is not None:
+            self._t += dt.timedelta(0, time)
+        self._cycle += 1
+        if entry is None:
+            if time is None:
+                dictout, self.soak_report, _ = self._solve_steady()
+            else:
+                dictout = self._run(dtime=time)
+            if key is not None:
+                stored = dict(dictout)
+                if "_detail" in stored:
+                    stored.update(stored.pop("_detail").get(self._detail_keys()))
+                library.put(key, self._bodytemp, stored)
+        else:
+            self._bodytemp = entry["bodytemp"].copy()
+            dictout = dict(entry["record"])
+            details = {key: dictout.pop(key) for key in list(dictout) if key in _DETAILS}
+            if details:
+                dictout["_detail"] = _Detail(values=details)
+            dictout["CycleTime"] = self._cycle
+            dictout["ModTime"] = self._t
+        self._history.append(dictout)
+        if self._writer is not None:
+            self._writer._simulated(self)
+        return entry is not None
+
+
+    def _cacheable(self):
+        """
+        Check that no boundary condition is overridden manually, so the
+        state is defined by the body and the input conditions.
+        """
+        return (self._hc is None and self._hr is None and self._to is None
+                and self._rt is None and self._wallFlux is None
+                and not self.ex_q.any())
+
+
+    def invalidate(self):
+        """
+        Drop the values precomputed for the body, the posture and the time
+        step. Call it after changing the anthropometrics, the conductance or
+        the capacity of the model; they are recalculated at the next step.
+        Changes of the posture and dtime are detected without it.
+        """
+        self._pre = {}
+        self._conv = None
+
+
+    def _precompute(self, dtime=None):
+        """
+        Values of a step which depend only on the body, the posture or dtime.
+        Each group is calculated when its key changes and kept until then.
+
+        Parameters
+        ----------
+        dtime : int or float, optional
+            Time delta [sec]. If None, the values for dtime are not updated.
+
+        Returns
+        -------
+        pre : dict
+            mbase, mbase_all : basal thermogenesis [W] (see threg.local_mbase).
+            hr : fixed radiative heat transfer coefficient [W/K.m2].
+            arr_cdt : conductance matrix [-] for dtime.
+            bf_entries, bf_coef : linear map of the 70 blood flows to the
+            blood flow matrix [-] for dtime (see _bloodflow_map).
+        """
+        pre = self._pre
+        body = (self._height, self._weight, self._age, self._sex, self._bmr_equation)
+        if pre.get("body") != body:
+            pre["body"] = body
+            pre["mbase"] = threg.local_mbase(*body)
+            pre["mbase_all"] = sum([m.sum() for m in pre["mbase"]])
+        if pre.get("posture") != self._posture:
+            pre["posture"] = self._posture
+            pre["hr"] = threg.fixed_hr(threg.rad_coef(self._posture,))
+        if dtime is not None and pre.get("dtime") != dtime:
+            pre["dtime"] = dtime
+            arr_cdt = self._cdt / self._cap.reshape((NUM_NODES,1)) # Change unit [W/K] to [/sec]
+            pre["arr_cdt"] = arr_cdt * dtime # Change unit [/sec] to [-]
+            entries, coef = _bloodflow_map()
+            pre["bf_entries"] = entries
+            pre["bf_coef"] = coef / self._cap[entries // NUM_NODES] * dtime
+        return pre
+
+
+    def _fixed_hc(self):
+        """
+        Fixed convective heat transfer coefficient [W/K.m2] of the current
+        skin temperatures and input conditions, kept until they change.
+        """
+        key = (self._posture, self._ta.tobytes(), self._va.tobytes(), self.Tsk.tobytes())
+        if self._conv is None or self._conv[0] != key:
+            hc = threg.fixed_hc(threg.conv_coef(self._posture, self._va, self._ta, self.Tsk,), self._va)
+            self._conv = (key, hc)
+        return self._conv[1]
+
+
+    def _solve(self, arrA, arr):
+        """
+        Solve the heat balance arrA @ bodytemp = arr with the selected solver.
+        """
+        stats = self.solver_stats
+        stats["solves"] += 1
+        reuse = self._reuse_tol is not None and self._solver != "inv"
+        if reuse:
+            bodytemp = self._solve_reuse(arrA, arr)
+            if bodytemp is not None:
+                stats["reused"] += 1
+                return bodytemp
+        stats["factorized"] += 1
+
+        if self._solver == "inv":
+            return np.dot(np.linalg.inv(arrA), arr)
+        elif not reuse:
+            if self._solver == "banded":
+                return self._band.solve(arrA, arr)
+            return np.linalg.solve(arrA, arr)
+
+        # Keep the factorization (as a function solving for a right side)
+        if self._solver == "banded":
+            inverse = self._band.factorize(arrA)
+        else:
+            from scipy.linalg import lu_factor, lu_solve
+            lu = lu_factor(arrA)
+            inverse = lambda arr: lu_solve(lu, arr)
+        self._factor = (arrA.copy(), np.abs(arrA).sum(axis=0).max(), inverse)
+        return inverse(arr)
+
+
+    def _solve_reuse(self, arrA, arr, max_iter=2, tol=1e-12):
+        """
+        Solve with the last factorization and iterative refinement.
+        Returns None if the matrix drifted by more than the reuse limit or
+        the refinement did not reach the residual tol (relative to arr) in
+        max_iter sweeps. A failed refinement lowers the limit to half its
+        drift, a successful one raises it again up to reuse_tol, so the
+        steps changing the matrix too fast are factorized directly.
+        """
+        if self._factor is None:
+            return None
+        arrA0, norm, inverse = self._factor
+        drift = np.abs(arrA - arrA0).sum(axis=0).max() / norm
+        if drift > self._reuse_limit:
+            return None
+
+        bodytemp = inverse(arr)
+        limit = tol * np.abs(arr).max()
+        for i in range(max_iter + 1):
+            residual = arr - arrA.dot(bodytemp)
+            if np.abs(residual).max() <= limit:
+                self._reuse_limit = min(2 * self._reuse_limit, self._reuse_tol)
+                return bodytemp
+            if i == max_iter:
+                break
+            bodytemp += inverse(residual)
+            self.solver_stats["refinements"] += 1
+        self._reuse_limit = drift / 2
+        return None
+
+
+    def _propagate(self, arrA, arr):
+        """
+        Exact step of the heat balance with the coefficients and the heat
+        sources frozen over dtime, so the error of the frozen sources remains.
+        The backward Euler step arrA @ bodytemp = arr is
+        (I + dtime*L) @ bodytemp = T + dtime*s for dT/dt = s - L @ T, whose
+        solution is T_inf + expm(-dtime*L) @ (T - T_inf) with the steady
+        state T_inf = L^-1 @ s.
+        """
+        arrM = arrA.copy()  # dtime*L
+        arrM.flat[::NUM_NODES+1] -= 1
+        steady = self._solve(arrM, arr - self._bodytemp)
+
+        propagator = self._propagator
+        if propagator is None or (np.abs(arrA - propagator[0]).sum(axis=0).max()
+                                  > self._propagator_tol * propagator[1]):
+            from scipy.linalg import expm
+            propagator = (arrA.copy(), np.abs(arrA).sum(axis=0).max(), expm(-arrM))
+            self._propagator = propagator
+            self.solver_stats["propagators"] += 1
+        return steady + propagator[2].dot(self._bodytemp - steady)
+
+
+    @property
+    def reuse_rate(self):
+        """
+        Share of the solves with a reused factorization [-].
+        """
+        return self.solver_stats["reused"] / max(self.solver_stats["solves"], 1)
+
+
+    def simulate(self, times, dtime=60, output=True, stride=1):
         """
         Execute JOS-3 model.
+        The output parameters are only calculated for the recorded steps.
 
         Parameters
         ----------
@@ -290,24 +761,275 @@ class JOS3():
             Number of loops of a simulation
         dtime : int or float, optional
             Time delta [sec]. The default is 60.
-        output : bool, optional
-            If you don't record paramters, set False. The default is True.
+        output : bool or str, optional
+            If you don't record paramters, set False.
+            If "last", only the last step of the call is recorded.
+            The default is True.
+        stride : int, optional
+            Record only the steps whose CycleTime is a multiple of stride,
+            also across calls. The default is 1 (every step).
 
         Returns
         -------
         None.
 
         """
+        if stride < 1:
+            raise ValueError("stride must be a positive integer.")
         for t in range(times):
             self._t += dt.timedelta(0, dtime)
             self._cycle += 1
-            dictdata = self._run(dtime=dtime, output=output)
+            if output == "last":
+                record = t == times - 1
+            else:
+                record = bool(output) and self._cycle % stride == 0
+            dictdata = self._run(dtime=dtime, output=record)
+            if record:
+                self._history.append(dictdata)
+                if self._writer is not None:
+                    self._writer._simulated(self)
+
+
+    def simulate_adaptive(self, duration, tol=0.01, dtime=60, dt_min=1, dt_max=3600, output=True):
+        """
+        Execute JOS-3 model over duration with step sizes controlled by an
+        estimate of the local error of the body temperatures.
+        Every step is taken once with dtime and twice with dtime/2; the
+        step is accepted (with the two half steps) if the results differ by
+        less than tol, else it is repeated with a smaller dtime. The next
+        dtime follows from the error, within dt_min and dt_max.
+
+        Parameters
+        ----------
+        duration : int or float
+            Time to simulate [sec].
+        tol : float, optional
+            Largest local error of the body temperatures of a step [oC].
+            The default is 0.01.
+        dtime : int or float, optional
+            First time delta [sec]. The default is 60.
+        dt_min, dt_max : int or float, optional
+            Smallest and largest time delta [sec]. A step of dt_min is
+            always accepted. The defaults are 1 and 3600.
+        output : bool, optional
+            If you don't record paramters, set False. The default is True.
+
+        Returns
+        -------
+        report : dict
+            "accepted" and "rejected" (numbers of steps), "dtime_min" and
+            "dtime_max" (of the accepted steps) [sec], "error" (largest
+            estimated error of the accepted steps) [oC] and "dtime", the
+            next time delta to continue with [sec].
+
+        Examples
+        -------
+        >>> model = jos3.JOS3()
+        >>> model.To = 20
+        >>> model.simulate_adaptive(7200)
+        {'accepted': 20, 'rejected': 3, 'dtime_min': 30.0, ...}
+        """
+        if not 0 < dt_min <= dt_max:
+            raise ValueError("dt_min and dt_max must be positive with dt_min <= dt_max.")
+        report = {"accepted": 0, "rejected": 0, "dtime_min": None, "dtime_max": None,
+                  "error": 0.0, "dtime": None}
+        dtime = min(max(dtime, dt_min), dt_max)
+        start, elapsed = self._t, 0
+        while duration - elapsed > 1e-9 * duration:
+            step = min(dtime, duration - elapsed)
+            bodytemp, pre_shiv = self._bodytemp, self._pre_shiv
+            self._run(dtime=step, output=False)
+            full = self._bodytemp
+            self._bodytemp, self._pre_shiv = bodytemp, pre_shiv
+            self._run(dtime=step/2, output=False)
+            dictdata = self._run(dtime=step/2, output=output)
+            error = np.abs(self._bodytemp - full).max()
+
+            # Step size for an error of tol/2 of the first order method
+            factor = min(max(0.9 * np.sqrt(0.5 * tol / max(error, 1e-12)), 0.2), 5.0)
+            if error > tol and step > dt_min:
+                self._bodytemp, self._pre_shiv = bodytemp, pre_shiv
+                report["rejected"] += 1
+                dtime = max(step * min(factor, 0.9), dt_min)
+                continue
+
+            report["accepted"] += 1
+            report["error"] = max(report["error"], float(error))
+            report["dtime_min"] = float(min(report["dtime_min"] or step, step))
+            report["dtime_max"] = float(max(report["dtime_max"] or step, step))
+            elapsed += step
+            self._t = start + dt.timedelta(0, elapsed)
+            self._cycle += 1
             if output:
-                # self.history.append(dictdata)
+                dictdata["CycleTime"] = self._cycle
+                dictdata["ModTime"] = self._t
+                dictdata["dt"] = step
+                self._history.append(dictdata)
+                if self._writer is not None:
+                    self._writer._simulated(self)
+            if step == dtime:
+                dtime = min(max(dtime * factor, dt_min), dt_max)
+        report["dtime"] = float(dtime)
+        return report
+
+
+    def simulate_series(self, inputs, dtime=60, output=True, stride=1):
+        """
+        Execute JOS-3 model through a time series of input conditions, a
+        step per row, e.g. to replay the boundary conditions of a coupled
+        CFD run. The rows are converted once for the whole series instead
+        of by the setters at every step.
+
+        Parameters
+        ----------
+        inputs : dict
+            Input conditions by name, as arrays with a row per step:
+            "Ta", "Tr", "RH", "Va", "Icl" ((T, 17) or (T,) for uniform
+            values), "PAR" ((T,)) and the manual settings "to" (operative
+            temperature), "rt" (dry heat resistance), "hc" and "hr"
+            ((T, 17) or (T,)). The inputs which are not given keep their
+            values. After the series, all the inputs keep the last row.
+        dtime : int, float or array, optional
+            Time delta [sec], or (T,) time deltas by step. The default is 60.
+        output : bool or str, optional
+            See simulate. The default is True.
+        stride : int, optional
+            See simulate. The default is 1.
+
+        Returns
+        -------
+        columns : dict or None
+            Arrays of (steps,) or (steps, ...) by output parameter of the
+            recorded steps of the series, None if output is False.
+
+        Examples
+        -------
+        >>> model = jos3.JOS3()
+        >>> ta = np.linspace(20, 30, 1800)
+        >>> results = model.simulate_series({"Ta": ta, "Tr": ta}, dtime=1)
+        >>> results["Tsk"].shape
+        (1800, 17)
+        """
+        if stride < 1:
+            raise ValueError("stride must be a positive integer.")
+        attributes = {"Ta": "_ta", "Tr": "_tr", "RH": "_rh", "Va": "_va", "Icl": "_clo",
+                      "PAR": "_par", "to": "_to", "rt": "_rt", "hc": "_hc", "hr": "_hr"}
+        unknown = set(inputs) - set(attributes)
+        if unknown:
+            raise ValueError("Unknown inputs {}, use {}.".format(sorted(unknown), list(attributes)))
+        rows = {}
+        for key, values in inputs.items():
+            values = np.asarray(values, dtype=float)
+            if key == "PAR":
+                if values.ndim != 1:
+                    raise ValueError("PAR must be a (T,) array, got shape {}.".format(values.shape))
+                rows[attributes[key]] = values.tolist()
+                continue
+            if values.ndim == 1:
+                values = values[:, None]
+            if values.ndim != 2 or values.shape[1] not in (1, 17):
+                raise ValueError("{} must be a (T, 17) or (T,) array, got shape {}.".format(
+                        key, np.shape(inputs[key])))
+            rows[attributes[key]] = np.ascontiguousarray(
+                    np.broadcast_to(values, (len(values), 17)))
+        times = set(len(values) for values in rows.values())
+        if np.ndim(dtime):
+            times.add(len(dtime))
+        if not times:
+            raise ValueError("The number of steps is unknown, give an input or (T,) dtime.")
+        if len(times) != 1:
+            raise ValueError("The inputs and dtime must have the same number of steps.")
+        times = times.pop()
+        if times == 0:
+            raise ValueError("The series has no steps.")
+        dtimes = np.asarray(dtime, dtype=float).tolist() if np.ndim(dtime) else [dtime] * times
+
+        recorded = 0
+        for t in range(times):
+            for name, values in rows.items():
+                setattr(self, name, values[t])
+            self._t += dt.timedelta(0, dtimes[t])
+            self._cycle += 1
+            if output == "last":
+                record = t == times - 1
+            else:
+                record = bool(output) and self._cycle % stride == 0
+            dictdata = self._run(dtime=dtimes[t], output=record)
+            if record:
+                recorded += 1
                 self._history.append(dictdata)
+                if self._writer is not None:
+                    self._writer._simulated(self)
+        # The rows may be views of the caller's arrays
+        for name, values in rows.items():
+            last = values[-1]
+            setattr(self, name, last.copy() if name != "_par" else last)
+        if not output:
+            return None
+        return self._columns(last=min(recorded, len(self._history)))
+
+
+    def steps(self, times=None, dtime=60, fields=None):
+        """
+        Iterate over the steps of JOS-3 model.
+        Every iteration advances the model by one step of dtime and yields
+        the output parameters of the step, which are not recorded in the
+        history. The inputs can be changed between the iterations, and
+        the memory does not grow with the number of steps.
+
+        Parameters
+        ----------
+        times : int, optional
+            Number of steps. The default is None (until the consumer stops).
+        dtime : int or float, optional
+            Time delta [sec]. The default is 60.
+        fields : list, optional
+            Output parameters yielded, also detailed ones (see ex_output).
+            The default is None (the parameters recorded by simulate).
+
+        Yields
+        ------
+        dictout : dict
+            Output parameters of the step by name.
+
+        Examples
+        -------
+        >>> model = jos3.JOS3()
+        >>> for record in model.steps(60, fields=["CycleTime", "TskMean"]):
+        ...     if record["TskMean"] > 34:
+        ...         model.Ta -= 1
+        """
+        # Checked before the generator starts, so a bad call leaves the model untouched
+        if fields is not None:
+            unknown = [key for key in fields if key not in _OUTPUTS and key not in _DETAILS]
+            if unknown:
+                raise ValueError("Unknown output parameters {}.".format(unknown))
+        return self._steps(times, dtime, fields)
+
+
+    def _steps(self, times, dtime, fields):
+        """
+        Generator of steps, see steps.
+        """
+        if fields is None:
+            details = self._detail_keys()
+        else:
+            details = [key for key in fields if key in _DETAILS]
+        step = 0
+        while times is None or step < times:
+            step += 1
+            self._t += dt.timedelta(0, dtime)
+            self._cycle += 1
+            dictout = self._run(dtime=dtime, detail=bool(details))
+            values = dictout.pop("_detail").get(details) if details else {}
+            if fields is None:
+                dictout.update(values)
+                yield dictout
+                continue
+            yield {key: dictout[key] if key in dictout else values[key] for key in fields}
 
 
-    def _run(self, dtime=60, passive=False, output=True):
+    def _run(self, dtime=60, passive=False, output=True, steady=False, detail=None):
         """
         Run a model for a once and get model parameters.
 
@@ -319,6 +1041,12 @@ class JOS3():
             If you run a passive model, set True. The default is False.
         output : bool, optional
             If you don't need paramters, set False. The default is True.
+        steady : bool, optional
+            If True, solve the steady heat balance for the current
+            thermoregulation instead of a time step. The default is False.
+        detail : bool, optional
+            Add the record of the detailed output parameters (_Detail).
+            The default is None (if ex_output is set).
 
         Returns
         -------
@@ -329,12 +1057,14 @@ class JOS3():
         tcr = self.Tcr
         tsk = self.Tsk
         wallFlux = None
+        pre = self._precompute(dtime)
         # Convective and radiative heat transfer coefficient [W/K.m2]
-        hc = threg.fixed_hc(threg.conv_coef(self._posture, self._va, self._ta, tsk,), self._va)
-        hr = threg.fixed_hr(threg.rad_coef(self._posture,))
+        hr = pre["hr"]
         # Manual setting
         if self._hc is not None:
             hc = self._hc
+        else:
+            hc = self._fixed_hc()
         if self._hr is not None:
             hr = self._hr
         if self._wallFlux is not None:
@@ -385,10 +1115,13 @@ class JOS3():
             bf_ava_foot = 0
 
         # Thermogenesis by shivering [W]
-        mshiv = threg.shivering(
-                err_cr, err_sk, tcr, tsk,
-                self._height, self._weight, self._bsa_equation, self._age, self._sex, dtime,
-                self.options,)
+        with _SHIV_LOCK:
+            threg.PRE_SHIV = self._pre_shiv
+            mshiv = threg.shivering(
+                    err_cr, err_sk, tcr, tsk,
+                    self._height, self._weight, self._bsa_equation, self._age, self._sex, dtime,
+                    self.options,)
+            self._pre_shiv = threg.PRE_SHIV
 
         # Thermogenesis by non-shivering [W]
         if self.options["nonshivering_thermogenesis"]:
@@ -402,10 +1135,8 @@ class JOS3():
         # Thermogenesis
         #------------------------------------------------------------------
         # Basal thermogenesis [W]
-        mbase = threg.local_mbase(
-                self._height, self._weight, self._age, self._sex,
-                self._bmr_equation,)
-        mbase_all = sum([m.sum() for m in mbase])
+        mbase = pre["mbase"]
+        mbase_all = pre["mbase_all"]
 
         # Thermogenesis by work [W]
         mwork = threg.local_mwork(mbase_all, self._par)
@@ -427,7 +1158,7 @@ class JOS3():
 
         # Sensible heat loss [W]
         if wallFlux is None:
-            shlsk = (tsk - to) / r_t * self._bsa
+            shlsk = (tsk - to) / r_t * self._bsa if output else None
         else:
             print('Setting sensible heat loss')
             seatFlux = np.zeros((17,))
@@ -436,67 +1167,40 @@ class JOS3():
             shlsk = wallFlux*self._bsa + seatFlux
             to = tsk - shlsk * r_t /self._bsa
 
-        # Cardiac output [L/h]
-        co = threg.sum_bf(
-                bf_cr, bf_ms, bf_fat, bf_sk, bf_ava_hand, bf_ava_foot)
-
-        # Weight loss rate by evaporation [g/sec]
-        wlesk = (e_sweat + 0.06*e_max) / 2418
-        wleres = res_lh / 2418
-
         #------------------------------------------------------------------
         # Matrix
         #------------------------------------------------------------------
         # Matrix A
-        # (83, 83,) ndarray
-        bf_art, bf_vein = matrix.vessel_bloodflow(
-                bf_cr, bf_ms, bf_fat, bf_sk, bf_ava_hand, bf_ava_foot
-                )
-        bf_local = matrix.localarr(
-                bf_cr, bf_ms, bf_fat, bf_sk, bf_ava_hand, bf_ava_foot
-                )
-        bf_whole = matrix.wholebody(
-                bf_art, bf_vein, bf_ava_hand, bf_ava_foot
-                )
-        arr_bf = np.zeros((NUM_NODES,NUM_NODES))
-        arr_bf += bf_local
-        arr_bf += bf_whole
-
-        arr_bf /= self._cap.reshape((NUM_NODES,1)) # Change unit [W/K] to [/sec]
-        arr_bf *= dtime # Change unit [/sec] to [-]
-
-        arr_cdt = self._cdt.copy()
-        arr_cdt /= self._cap.reshape((NUM_NODES,1)) # Change unit [W/K] to [/sec]
-        arr_cdt *= dtime # Change unit [/sec] to [-]
+        # (85, 85,) ndarray
+        # Blood flow [-], by the linear map of matrix.localarr and matrix.wholebody
+        flows = np.concatenate([bf_cr, bf_ms, bf_fat, bf_sk, [bf_ava_hand, bf_ava_foot]])
+        arr_bf = np.zeros(NUM_NODES*NUM_NODES)
+        arr_bf[pre["bf_entries"]] = flows.dot(pre["bf_coef"])
+        arr_bf = arr_bf.reshape((NUM_NODES,NUM_NODES))
 
         arrB = np.zeros(NUM_NODES)
-        arrB[INDEX["skin"]] += 1/r_t*self._bsa
+        arrB[_INDEX["skin"]] += 1/r_t*self._bsa
         arrB /= self._cap # Change unit [W/K] to [/sec]
         arrB *= dtime # Change unit [/sec] to [-]
 
-        arrA_tria = -(arr_cdt + arr_bf)
+        arrA_tria = pre["arr_cdt"] + arr_bf
+        arrA = -arrA_tria
 
-        arrA_dia = arr_cdt + arr_bf
-        arrA_dia = arrA_dia.sum(axis=1) + arrB
-        arrA_dia = np.diag(arrA_dia)
-        arrA_dia += np.eye(NUM_NODES)
-
-        arrA = arrA_tria + arrA_dia
-        arrA_inv = np.linalg.inv(arrA)
+        arrA_dia = arrA_tria.sum(axis=1) + arrB
+        if not steady:
+            arrA_dia += 1
+        arrA.flat[::NUM_NODES+1] += arrA_dia
 
         # Matrix Q [W] / [J/K] * [sec] = [-]
         # Thermogensis
         arrQ = np.zeros(NUM_NODES)
-        arrQ[INDEX["core"]] += qcr
-        arrQ[INDEX["muscle"]] += qms[VINDEX["muscle"]]
-        arrQ[INDEX["fat"]] += qfat[VINDEX["fat"]]
-        arrQ[INDEX["skin"]] += qsk
+        arrQ[_QNODES] = np.concatenate([qcr, qms[_VINDEX["muscle"]], qfat[_VINDEX["fat"]], qsk])
 
         # Respiratory [W]
-        arrQ[INDEX["core"][2]] -= res_sh + res_lh #Chest core
+        arrQ[_INDEX["core"][2]] -= res_sh + res_lh #Chest core
 
         # Sweating [W]
-        arrQ[INDEX["skin"]] -= e_sk
+        arrQ[_INDEX["skin"]] -= e_sk
 
         # Extra heat gain [W]
         arrQ += self.ex_q.copy()
@@ -506,21 +1210,35 @@ class JOS3():
 
         # Boundary batrix [℃]
         arr_to = np.zeros(NUM_NODES)
-        arr_to[INDEX["skin"]] += to
+        arr_to[_INDEX["skin"]] += to
 
         # all
-        arr = self._bodytemp + arrB * arr_to + arrQ
+        if steady:
+            arr = arrB * arr_to + arrQ
+        else:
+            arr = self._bodytemp + arrB * arr_to + arrQ
 
         #------------------------------------------------------------------
         # New body temp. [oC]
         #------------------------------------------------------------------
-        self._bodytemp = np.dot(arrA_inv, arr)
+        if self._integrator == "exponential" and not steady:
+            self._bodytemp = self._propagate(arrA, arr)
+        else:
+            self._bodytemp = self._solve(arrA, arr)
 
         #------------------------------------------------------------------
         # Output paramters
         #------------------------------------------------------------------
         dictout = {}
         if output:  # Default output
+            # Cardiac output [L/h]
+            co = threg.sum_bf(
+                    bf_cr, bf_ms, bf_fat, bf_sk, bf_ava_hand, bf_ava_foot)
+
+            # Weight loss rate by evaporation [g/sec]
+            wlesk = (e_sweat + 0.06*e_max) / 2418
+            wleres = res_lh / 2418
+
             dictout["CycleTime"] = self._cycle
             dictout["ModTime"] = self._t
             dictout["dt"] = dtime
@@ -538,72 +1256,127 @@ class JOS3():
             dictout["LHLsk"] = e_sk
             dictout["wESweat"] = wlesk
 
-        detailout = {}
-        if self._ex_output and output:
-            detailout["Name"] = self.model_name
-            detailout["Height"] = self._height
-            detailout["Weight"] = self._weight
-            detailout["BSA"] = self._bsa
-            detailout["Fat"] = self._fat
-            detailout["Sex"] = self._sex
-            detailout["Age"] = self._age
-            detailout["Setptcr"] = setpt_cr
-            detailout["Setptsk"] = setpt_sk
-            detailout["Tcb"] = self.Tcb
-            detailout["Tar"] = self.Tar
-            detailout["Tve"] = self.Tve
-            detailout["Tsve"] = self.Tsve
-            detailout["Tms"] = self.Tms
-            detailout["Tfat"] = self.Tfat
-            detailout["To"] = to
-            detailout["Rt"] = r_t
-            detailout["Ret"] = r_et
-            detailout["Ta"] = self._ta.copy()
-            detailout["Tr"] = self._tr.copy()
-            detailout["RH"] = self._rh.copy()
-            detailout["Va"] = self._va.copy()
-            detailout["PAR"] = self._par
-            detailout["Icl"] = self._clo.copy()
-            detailout["Esk"] = e_sk
-            detailout["Emax"] = e_max
-            detailout["Esweat"] = e_sweat
-            detailout["BFcr"] = bf_cr
-            detailout["BFms"] = bf_ms[VINDEX["muscle"]]
-            detailout["BFfat"] = bf_fat[VINDEX["fat"]]
-            detailout["BFsk"] = bf_sk
-            detailout["BFava_hand"] = bf_ava_hand
-            detailout["BFava_foot"] = bf_ava_foot
-            detailout["Mbasecr"] = mbase[0]
-            detailout["Mbasems"] = mbase[1][VINDEX["muscle"]]
-            detailout["Mbasefat"] = mbase[2][VINDEX["fat"]]
-            detailout["Mbasesk"] = mbase[3]
-            detailout["Mwork"] = mwork
-            detailout["Mshiv"] = mshiv
-            detailout["Mnst"] = mnst
-            detailout["Qcr"] = qcr
-            detailout["Qms"] = qms[VINDEX["muscle"]]
-            detailout["Qfat"] = qfat[VINDEX["fat"]]
-            detailout["Qsk"] = qsk
-            dictout["SHLsk"] = shlsk
-            dictout["LHLsk"] = e_sk
-            dictout["RESsh"] = res_sh
-            dictout["RESlh"] = res_lh
+        if detail is None:
+            detail = bool(self._ex_output)
+        if detail and output:
+            # Detailed output parameters, only the intermediates of this
+            # step. The parameters are derived when
+            # the results are read, see _Detail.
+            dictout["_detail"] = _Detail(raw={
+                "name": self.model_name,
+                "height": self._height,
+                "weight": self._weight,
+                "bsa": self._bsa,
+                "fat": self._fat,
+                "sex": self._sex,
+                "age": self._age,
+                "setpt_cr": setpt_cr,
+                "setpt_sk": setpt_sk,
+                "bodytemp": self._bodytemp.copy(),
+                "to": np.array(to),  # Copies, To and Rt can be set manually
+                "r_t": np.array(r_t),
+                "r_et": r_et,
+                "ta": self._ta.copy(),
+                "tr": self._tr.copy(),
+                "rh": self._rh.copy(),
+                "va": self._va.copy(),
+                "par": self._par,
+                "clo": self._clo.copy(),
+                "e_sk": e_sk,
+                "e_max": e_max,
+                "e_sweat": e_sweat,
+                "bf_cr": bf_cr,
+                "bf_ms": bf_ms,
+                "bf_fat": bf_fat,
+                "bf_sk": bf_sk,
+                "bf_ava_hand": bf_ava_hand,
+                "bf_ava_foot": bf_ava_foot,
+                "mbase_cr": mbase[0],
+                "mbase_ms": mbase[1],
+                "mbase_fat": mbase[2],
+                "mbase_sk": mbase[3],
+                "mwork": mwork,
+                "mshiv": mshiv,
+                "mnst": mnst,
+                "qcr": qcr,
+                "qms": qms,
+                "qfat": qfat,
+                "qsk": qsk,
+                })
+        return dictout
 
 
+    def _detail_keys(self):
+        """
+        Detailed output parameters selected by ex_output.
+        """
         if self._ex_output == "all":
-            dictout.update(detailout)
+            return list(_DETAILS)
         elif isinstance(self._ex_output, list):  # if ex_out type is list
-            outkeys = detailout.keys()
-            for key in self._ex_output:
-                if key in outkeys:
-                    dictout[key] = detailout[key]
-        return dictout
+            return [key for key in dict.fromkeys(self._ex_output) if key in _DETAILS]
+        return []
+
+
+    def _columns(self, keys=None, **kwargs):
+        """
+        History.columns with the detailed output parameters derived from
+        the records of the steps, in place of the "_detail" column.
+
+        Parameters
+        ----------
+        keys : list, optional
+            Names of the parameters in the order of the columns, also
+            detailed ones which are not selected by ex_output. Raises
+            KeyError for the parameters which are not recorded.
+            The default is None (the parameters selected by ex_output).
+        **kwargs
+            last, start and stop of History.columns.
 
+        Returns
+        -------
+        columns : dict
+            Arrays of (steps,) or (steps, ...) by parameter.
+        """
+        stored = self._history.shapes()
+        requested = None if keys is None else list(dict.fromkeys(keys))
+        if keys is None:
+            details = self._detail_keys()
+            keys = list(stored)
+        else:
+            details = [key for key in requested if key in _DETAILS and key not in stored]
+            unknown = [key for key in requested if key not in stored and
+                       (key not in details or "_detail" not in stored)]
+            if unknown:
+                raise KeyError("Unknown output parameters {}.".format(unknown))
+            keys = [key for key in requested if key not in details]
+            if details:
+                keys.append("_detail")
+        columns = {}
+        for key, column in self._history.columns(keys, **kwargs).items():
+            if key == "_detail":
+                columns.update(_Detail.columns(column, details))
+            else:
+                columns[key] = column
+        if requested is not None:  # In the order of the keys
+            columns = {key: columns[key] for key in requested}
+        return columns
 
-    def dict_results(self):
+
+    def dict_results(self, last=None, keys=None):
         """
         Get results as pandas.DataFrame format.
 
+        Parameters
+        ----------
+        last : int, optional
+            Only the last steps, e.g. 1 for the current state.
+            The default is None (all recorded steps).
+        keys : list, optional
+            Only these output parameters in this order, e.g. ["Tsk", "Tcb"].
+            Any detailed parameter can be selected if ex_output is set,
+            other names raise KeyError.
+            The default is None (all recorded parameters).
+
         Returns
         -------
         Dictionaly of the results
@@ -612,6 +1385,47 @@ class JOS3():
             print("The model has no data.")
             return None
 
+        outdict = self._flatten(self._columns(keys, last=last))
+        return {key: values.tolist() for key, values in outdict.items()}
+
+
+    def _flatten(self, columns):
+        """
+        Split the parameters by body segment into the columns of the results.
+
+        Parameters
+        ----------
+        columns : dict
+            Arrays of History.columns.
+
+        Returns
+        -------
+        outdict : dict
+            Arrays of (steps,) by column title.
+        """
+        outdict = {}
+        shapes = {key: column.shape[1:] for key, column in columns.items()}
+        for key, names in self._column_names(shapes).items():
+            column = columns[key]
+            if column.ndim == 1:
+                outdict[key] = column
+            else:
+                for name, values in zip(names, column.T):
+                    outdict[name] = values
+        return outdict
+
+
+    def _column_names(self, shapes):
+        """
+        Column titles of the results by output parameter, derived once for
+        the parameters and shapes of the values.
+        If the values are iter, add the body names as suffix words.
+        The single value data (and str) are kept as a column.
+        """
+        signature = tuple(shapes.items())
+        if self._schema is not None and self._schema[0] == signature:
+            return self._schema[1]
+
         def check_word_contain(word, *args):
             """
             Check if word contains *args.
@@ -622,46 +1436,23 @@ class JOS3():
                     boolfilter = True
             return boolfilter
 
-        # Set column titles
-        # If the values are iter, add the body names as suffix words.
-        # If the values are not iter and the single value data, convert it to iter.
         key2keys = {}  # Column keys
-        for key, value in self._history[0].items():
-            try:
-                length = len(value)
-                if isinstance(value, str):
-                    keys = [key]  # str is iter. Convert to list without suffix
-                elif check_word_contain(key, "sve", "sfv", "superficialvein"):
-                    keys = [key+BODY_NAMES[i] for i in VINDEX["sfvein"]]
-                elif check_word_contain(key, "ms", "muscle"):
-                    keys = [key+BODY_NAMES[i] for i in VINDEX["muscle"]]
-                elif check_word_contain(key, "fat"):
-                    keys = [key+BODY_NAMES[i] for i in VINDEX["fat"]]
-                elif length == 17:  # if data contains 17 values
-                    keys = [key+bn for bn in BODY_NAMES]
-                else:
-                    keys = [key+BODY_NAMES[i] for i in range(length)]
-            except TypeError:  # if the value is not iter.
-                keys= [key]  # convert to iter
-            key2keys.update({key: keys})
-
-        data = []
-        for i, dictout in enumerate(self._history):
-            row = {}
-            for key, value in dictout.items():
-                keys = key2keys[key]
-                if len(keys) == 1:
-                    values = [value]  # make list if value is not iter
-                else:
-                    values = value
-                row.update(dict(zip(keys, values)))
-            data.append(row)
-
-        outdict = dict(zip(data[0].keys(), [[] for i in range(len(data[0].keys()))]))
-        for row in data:
-            for k in data[0].keys():
-                outdict[k].append(row[k])
-        return outdict
+        for key, shape in shapes.items():
+            if not shape:
+                keys = [key]
+            elif check_word_contain(key, "sve", "sfv", "superficialvein"):
+                keys = [key+BODY_NAMES[i] for i in VINDEX["sfvein"]]
+            elif check_word_contain(key, "ms", "muscle"):
+                keys = [key+BODY_NAMES[i] for i in VINDEX["muscle"]]
+            elif check_word_contain(key, "fat"):
+                keys = [key+BODY_NAMES[i] for i in VINDEX["fat"]]
+            elif shape[0] == 17:  # if data contains 17 values
+                keys = [key+bn for bn in BODY_NAMES]
+            else:
+                keys = [key+BODY_NAMES[i] for i in range(shape[0])]
+            key2keys[key] = keys
+        self._schema = (signature, key2keys)
+        return key2keys
 
 
     def to_csv(self, path=None, folder=None, unit=True, meanig=True):
@@ -699,36 +1490,10 @@ class JOS3():
                 path = folder + os.sep + path
         elif not ((path[-4:] == ".csv") or (path[-4:] == ".txt")):
             path += ".csv"
-        dictout = self.dict_results()
-
-        columns = [k for k in dictout.keys()]
-        units = []
-        meanigs = []
-        for col in columns:
-            param, rbn = remove_bodyname(col)
-            if param in ALL_OUT_PARAMS:
-                u = ALL_OUT_PARAMS[param]["unit"]
-                units.append(u)
-
-                m = ALL_OUT_PARAMS[param]["meaning"]
-                if rbn:
-                    meanigs.append(m.replace("body part", rbn))
-                else:
-                    meanigs.append(m)
-            else:
-                units.append("")
-                meanigs.append("")
 
-        with open(path, "wt", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow(list(columns))
-            if unit: writer.writerow(units)
-            if meanig: writer.writerow(meanigs)
-            for i in range(len(dictout["CycleTime"])):
-                row = []
-                for k in columns:
-                    row.append(dictout[k][i])
-                writer.writerow(row)
+        # Written in chunks of the history, see ResultWriter for other formats
+        with ResultWriter(path, unit=unit, meaning=meanig) as writer:
+            writer.write(self)
 
 
     #--------------------------------------------------------------------------
@@ -802,11 +1567,11 @@ class JOS3():
         """
         if self._to is None:
             if self._hc is None:
-                hc = threg.fixed_hc(threg.conv_coef(self._posture, self._va, self._ta, self.Tsk,), self._va)
+                hc = self._fixed_hc()
             else:
                 hc = self._hc
             if self._hr is None:
-                hr = threg.fixed_hr(threg.rad_coef(self._posture,))
+                hr = self._precompute()["hr"]
             else:
                 hr = self._hr
             to = threg.operative_temp(self._ta, self._tr, hc, hr,)
@@ -980,8 +1745,8 @@ class JOS3():
         Rt : numpy.ndarray (17,)
             Dry heat resistances between the skin and ambience areas by local body segments [K.m2/W].
         """
-        hc = threg.fixed_hc(threg.conv_coef(self._posture, self._va, self._ta, self.Tsk,), self._va)
-        hr = threg.fixed_hr(threg.rad_coef(self._posture,))
+        hc = self._fixed_hc()
+        hr = self._precompute()["hr"]
         return threg.dry_r(hc, hr, self._clo)
 
     @property
@@ -994,7 +1759,7 @@ class JOS3():
         Ret : numpy.ndarray (17,)
             Wet (Evaporative) heat resistances between the skin and ambience areas by local body segments [Pa.m2/W].
         """
-        hc = threg.fixed_hc(threg.conv_coef(self._posture, self._va, self._ta, self.Tsk,), self._va)
+        hc = self._fixed_hc()
         return threg.wet_r(hc, self._clo, self._iclo)
 
     @property
@@ -1038,7 +1803,7 @@ class JOS3():
         TskMean : float
             Mean skin temperature of the whole body [oC].
         """
-        return np.average(self._bodytemp[INDEX["skin"]], weights=_BSAst)
+        return np.average(self._bodytemp[_INDEX["skin"]], weights=_BSAst)
 
     @property
     def Tsk(self):
@@ -1050,7 +1815,7 @@ class JOS3():
         Tsk : numpy.ndarray (17,)
             Skin temperatures by the local body segments [oC].
         """
-        return self._bodytemp[INDEX["skin"]].copy()
+        return self._bodytemp[_INDEX["skin"]].copy()
 
     @property
     def Tcr(self):
@@ -1062,7 +1827,7 @@ class JOS3():
         Tcr : numpy.ndarray (17,)
             Skin temperatures by the local body segments [oC].
         """
-        return self._bodytemp[INDEX["core"]].copy()
+        return self._bodytemp[_INDEX["core"]].copy()
 
     @property
     def Tcb(self):
@@ -1086,7 +1851,7 @@ class JOS3():
         Tar : numpy.ndarray (17,)
             Arterial temperatures by the local body segments [oC].
         """
-        return self._bodytemp[INDEX["artery"]].copy()
+        return self._bodytemp[_INDEX["artery"]].copy()
 
     @property
     def Tve(self):
@@ -1098,7 +1863,7 @@ class JOS3():
         Tve : numpy.ndarray (17,)
             Vein temperatures by the local body segments [oC].
         """
-        return self._bodytemp[INDEX["vein"]].copy()
+        return self._bodytemp[_INDEX["vein"]].copy()
 
     @property
     def Tsve(self):
@@ -1110,7 +1875,7 @@ class JOS3():
         Tsve : numpy.ndarray (12,)
             Superfical vein temperatures by the local body segments [oC].
         """
-        return self._bodytemp[INDEX["sfvein"]].copy()
+        return self._bodytemp[_INDEX["sfvein"]].copy()
 
     @property
     def Tms(self):
@@ -1122,7 +1887,7 @@ class JOS3():
         Tms : numpy.ndarray (2,)
             Muscle temperatures of Head and Pelvis [oC].
         """
-        return self._bodytemp[INDEX["muscle"]].copy()
+        return self._bodytemp[_INDEX["muscle"]].copy()
 
     @property
     def Tfat(self):
@@ -1134,7 +1899,7 @@ class JOS3():
         Tfat : numpy.ndarray (2,)
             Fat temperatures of Head and Pelvis  [oC].
         """
-        return self._bodytemp[INDEX["fat"]].copy()
+        return self._bodytemp[_INDEX["fat"]].copy()
 
     @property
     def bodyname(self):
@@ -1179,6 +1944,1752 @@ class JOS3():
         return bmr / self.BSA.sum()
 
 
+# Coefficients of the thermoregulation (see thermoregulation.py) used by JOS3Batch
+_RECEPTOR = np.array([  # SKINR
+        0.0549, 0.0146, 0.1492, 0.1321, 0.2122,
+        0.0227, 0.0117, 0.0923, 0.0227, 0.0117, 0.0923,
+        0.0501, 0.0251, 0.0167, 0.0501, 0.0251, 0.0167,])
+_SKIN_SWEAT = np.array([  # SKINS
+        0.064, 0.017, 0.146, 0.129, 0.206,
+        0.051, 0.026, 0.0155, 0.051, 0.026, 0.0155,
+        0.073, 0.036, 0.0175, 0.073, 0.036, 0.0175,])
+_SD_SWEAT_60 = np.array([  # Signal decrement of sweating from 60 years
+        0.69, 0.69, 0.59, 0.52, 0.40,
+        0.75, 0.75, 0.75, 0.75, 0.75, 0.75,
+        0.40, 0.40, 0.40, 0.40, 0.40, 0.40,])
+_BFB_SK = np.array([  # BFBsk
+        1.754, 0.325, 1.967, 1.475, 2.272,
+        0.91, 0.508, 1.114, 0.91, 0.508, 1.114,
+        1.456, 0.651, 0.934, 1.456, 0.651, 0.934,])
+_SKIN_DILAT = np.array([  # SKIND
+        0.0692, 0.0992, 0.0580, 0.0679, 0.0707,
+        0.0400, 0.0373, 0.0632, 0.0400, 0.0373, 0.0632,
+        0.0736, 0.0411, 0.0623, 0.0736, 0.0411, 0.0623,])
+_SKIN_STRIC = np.array([  # SKINC
+        0.0213, 0.0213, 0.0638, 0.0638, 0.0638,
+        0.0213, 0.0213, 0.1489, 0.0213, 0.0213, 0.1489,
+        0.0213, 0.0213, 0.1489, 0.0213, 0.0213, 0.1489,])
+_SD_DILAT_60 = np.array([  # Signal decrement of vasodilation from 60 years
+        0.91, 0.91, 0.47, 0.47, 0.31,
+        0.47, 0.47, 0.47, 0.47, 0.47, 0.47,
+        0.31, 0.31, 0.31, 0.31, 0.31, 0.31,])
+_CAP_BCR = [10.2975, 9.3935, 13.834]  # Thermal capacity at Chest, Back and Pelvis
+_SHIVF = np.array([
+        0.0339, 0.0436, 0.27394, 0.24102, 0.38754,
+        0.00243, 0.00137, 0.0002, 0.00243, 0.00137, 0.0002,
+        0.0039, 0.00175, 0.00035, 0.0039, 0.00175, 0.00035,])
+_MNSTF = np.array([
+        0.000, 0.190, 0.000, 0.190, 0.190,
+        0.215, 0.000, 0.000, 0.215, 0.000, 0.000,
+        0.000, 0.000, 0.000, 0.000, 0.000, 0.000,])
+_MUSCLE = np.isin(np.arange(17), VINDEX["muscle"])  # Segments with a muscle layer
+
+
+def _shiv_age_factor(age):
+    """
+    Signal decrement of shivering by aging [-].
+    """
+    for limit, factor in ((30, 1.), (40, 0.97514), (50, 0.95028), (60, 0.92818),
+                          (70, 0.90055), (80, 0.86188)):
+        if age < limit:
+            return factor
+    return 0.82597
+
+
+def _nst_limit(height, weight, age, coldacclimation, batpositive):
+    """
+    Upper limit of non-shivering thermogenesis [W] (Asaka, 2016).
+    """
+    bmi = weight / height**2
+    bat = 10**(-0.10502 * bmi + 2.7708)  # BAT: brown adipose tissue [SUV]
+    if age < 30:
+        bat *= 1.61
+    elif age < 40:
+        bat *= 1.00
+    else:
+        bat *= 0.80
+    if coldacclimation:
+        bat += 3.46
+    if not batpositive:
+        if age < 30:
+            bat *= 44/83
+        elif age < 40:
+            bat *= 15/38
+        elif age < 50:
+            bat *= 7/26
+        else:
+            bat *= 0
+    return (1.80 * bat + 2.43) + 5.62
+
+
+_BF_MAP = None
+def _bloodflow_map():
+    """
+    Linear map from the blood flows (bf_cr, bf_ms, bf_fat, bf_sk (17 each),
+    bf_ava_hand, bf_ava_foot) to the entries of the blood flow matrix
+    (matrix.localarr + matrix.wholebody) [W/K].
+
+    Returns
+    -------
+    entries : numpy.ndarray
+        Flat indices of the (85, 85) entries that blood flow can produce.
+    coef : numpy.ndarray (70, len(entries))
+        Contribution of each blood flow to the entries.
+    """
+    global _BF_MAP
+    if _BF_MAP is None:
+        coef = []
+        for flows in np.eye(70):
+            bf_cr, bf_ms, bf_fat, bf_sk = flows[:68].reshape(4, 17)
+            bf_art, bf_vein = matrix.vessel_bloodflow(
+                    bf_cr, bf_ms, bf_fat, bf_sk, flows[68], flows[69])
+            arr = (matrix.localarr(bf_cr, bf_ms, bf_fat, bf_sk, flows[68], flows[69])
+                   + matrix.wholebody(bf_art, bf_vein, flows[68], flows[69]))
+            coef.append(arr.ravel())
+        coef = np.array(coef)
+        entries = np.nonzero(coef.any(axis=0))[0]
+        _BF_MAP = (entries, coef[:, entries])
+    return _BF_MAP
+
+
+class JOS3Batch():
+    """
+    Batch of JOS-3 models advanced together.
+
+    The body temperatures of M bodies are held as one (M, 85) array and the
+    input conditions as (M, 17) arrays. Every body keeps its own
+    anthropometrics, setpoints, posture and options, while the
+    thermoregulation, the matrix assembly and the linear solve of a step
+    run as batched NumPy operations for all bodies at once.
+
+    Parameters
+    ----------
+    models : list of JOS3
+        Bodies of the batch. Their anthropometrics, setpoints, body
+        temperatures, input conditions, posture, options and ex_q are
+        copied, the models themselves are not changed.
+        Manually set hc, hr, To, Rt or wall heat fluxes are not supported.
+    max_history : int, optional
+        Keep only the outputs of the last max_history steps (see History).
+        The default is None (all steps).
+
+
+    Setter & Getter
+    -------
+    Ta, Tr, To, RH, Va, Icl : float, list (17,) or numpy.ndarray (M, 17)
+        Input conditions, as in JOS3 but by body.
+    PAR : float or numpy.ndarray (M,)
+        Physical activity ratio [-].
+    bodytemp : numpy.ndarray (M, 85)
+        All segment temperatures of the bodies.
+
+    Getter
+    -------
+    Tsk, Tcr : numpy.ndarray (M, 17)
+        Skin and core temperatures [oC].
+    TskMean : numpy.ndarray (M,)
+        Mean skin temperatures [oC].
+
+
+    Examples
+    -------
+    >>> import jos3
+    >>> models = [jos3.JOS3(height=h, weight=22*h**2, setpt_cache=True)
+    ...           for h in (1.6, 1.7, 1.8)]
+    >>> batch = jos3.JOS3Batch(models)
+    >>> batch.Ta = 20
+    >>> batch.simulate(60)
+    >>> results = batch.dict_results()  # Arrays of (steps, M, ...)
+    >>> results["TskMean"][-1]
+    """
+    def __init__(self, models, max_history=None):
+        for model in models:
+            if not (model._hc is None and model._hr is None and model._to is None
+                    and model._rt is None and model._wallFlux is None):
+                raise ValueError("JOS3Batch does not support manually set hc, hr, To, Rt or wall heat fluxes.")
+            if model._integrator != "euler":
+                raise ValueError("JOS3Batch only advances with the backward Euler integrator.")
+        self.num = len(models)
+        body = lambda name: np.array([getattr(model, name) for model in models], dtype=float)
+
+        # Anthropometrics and the values derived from them
+        self._height = body("_height")
+        self._weight = body("_weight")
+        self._age = body("_age")
+        self._male = np.array([model._sex == "male" for model in models])
+        self._bsa_rate = body("_bsa_rate")
+        self._bsa = body("_bsa")
+        self._bfb_rate = body("_bfb_rate")
+        self._cap = body("_cap")
+        mbase = [threg.local_mbase(model._height, model._weight, model._age,
+                                   model._sex, model._bmr_equation)
+                 for model in models]
+        self._mbase = [np.array(m) for m in zip(*mbase)]  # cr, ms, fat, sk
+        self._mbase_all = np.array([sum([m.sum() for m in mb]) for mb in mbase])
+        bfb = [threg.crmsfat_bloodflow(np.zeros(17), np.zeros(17), model._height,
+                                       model._weight, model._bsa_equation,
+                                       model._age, model._ci)
+               for model in models]
+        self._bfb = [np.array(b) for b in zip(*bfb)]  # Basal cr, ms, fat
+        self._sd_sweat = np.where(self._age[:, None] < 60, 1., _SD_SWEAT_60)
+        self._sd_dilat = np.where(self._age[:, None] < 60, 1., _SD_DILAT_60)
+        self._sd_shiv = np.array([_shiv_age_factor(age) for age in self._age])
+
+        # Posture and options
+        self._posture = [model._posture for model in models]
+        self._hr = np.array([threg.fixed_hr(threg.rad_coef(posture))
+                             for posture in self._posture])
+        self.options = [dict(model.options) for model in models]
+        self._nst = np.array([opt["nonshivering_thermogenesis"] for opt in self.options])
+        self._nst_limit = np.array([
+                _nst_limit(model._height, model._weight, model._age,
+                           opt["cold_acclimated"], opt["bat_positive"])
+                for model, opt in zip(models, self.options)])
+        self._shiv_threshold = np.array([bool(opt["shivering_threshold"]) for opt in self.options])
+        self._shiv_limit = np.array([  # [W/s], nan if not limited
+                0.0077 if opt["limit_dshiv/dt"] is True
+                else opt["limit_dshiv/dt"] if opt["limit_dshiv/dt"] else np.nan
+                for opt in self.options], dtype=float)
+        self._pre_shiv = body("_pre_shiv")  # Previous shivering thermogenesis [W]
+
+        # State and input conditions
+        self.setpt_cr = body("setpt_cr")
+        self.setpt_sk = body("setpt_sk")
+        self._bodytemp = body("_bodytemp")
+        self._ta = body("_ta")
+        self._tr = body("_tr")
+        self._rh = body("_rh")
+        self._va = body("_va")
+        self._clo = body("_clo")
+        self._iclo = body("_iclo")
+        self._par = body("_par")
+        self.ex_q = body("ex_q")
+
+        # Entries of the matrix connecting nodes by conduction or blood flow
+        bf_entries, bf_coef = _bloodflow_map()
+        cdt = body("_cdt").reshape((self.num, -1))
+        entries = np.union1d(np.nonzero(cdt.any(axis=0))[0], bf_entries)
+        self._entries = entries
+        self._rows = entries // NUM_NODES
+        self._cdt_entries = cdt[:, entries]  # [W/K]
+        self._bf_coef = np.zeros((len(bf_coef), len(entries)))
+        self._bf_coef[:, np.searchsorted(entries, bf_entries)] = bf_coef
+        self._rowsum = (self._rows[:, None] == np.arange(NUM_NODES)).astype(float)
+        self._t = dt.timedelta(0) # Elapsed time
+        self._cycle = 0 # Cycle time
+        self._history = History(max_history)
+
+
+    def simulate(self, times, dtime=60, output=True, stride=1):
+        """
+        Execute the JOS-3 models of the batch.
+
+        Parameters
+        ----------
+        times : int
+            Number of loops of a simulation
+        dtime : int or float, optional
+            Time delta [sec]. The default is 60.
+        output : bool or str, optional
+            If you don't record paramters, set False.
+            If "last", only the last step of the call is recorded.
+            The default is True.
+        stride : int, optional
+            Record only the steps whose CycleTime is a multiple of stride.
+            The default is 1 (every step).
+
+        Returns
+        -------
+        None.
+
+        """
+        if stride < 1:
+            raise ValueError("stride must be a positive integer.")
+        for t in range(times):
+            self._t += dt.timedelta(0, dtime)
+            self._cycle += 1
+            if output == "last":
+                record = t == times - 1
+            else:
+                record = bool(output) and self._cycle % stride == 0
+            dictdata = self._run(dtime=dtime, output=record)
+            if record:
+                self._history.append(dictdata)
+
+
+    def _run(self, dtime=60, output=True):
+        """
+        Run the models for a once, see JOS3._run.
+        """
+        num = self.num
+        tcr = self.Tcr
+        tsk = self.Tsk
+        ta, rh, va = self._ta, self._rh, self._va
+
+        # Convective and radiative heat transfer coefficient [W/K.m2]
+        hc = self._fixed_hc(tsk)
+        hr = self._hr
+
+        # Operarive temp. [oC], heat and evaporative heat resistance [m2.K/W], [m2.kPa/W]
+        to = threg.operative_temp(ta, self._tr, hc, hr)
+        r_t = threg.dry_r(hc, hr, self._clo)
+        r_et = threg.wet_r(hc, self._clo, self._iclo)
+
+        #------------------------------------------------------------------
+        # Thermoregulation
+        #------------------------------------------------------------------
+        err_cr = tcr - self.setpt_cr
+        err_sk = tsk - self.setpt_sk
+        wrms = (np.maximum(err_sk, 0) * _RECEPTOR).sum(axis=1)
+        clds = (np.minimum(err_sk, 0) * -_RECEPTOR).sum(axis=1)
+        bsar = self._bsa_rate
+        bfbr = self._bfb_rate
+
+        # Skinwettedness [-], Esk, Emax, Esw [W]
+        p_a = threg.antoine(ta)*rh/100
+        e_max = (threg.antoine(tsk) - p_a) / r_et * (_BSAst * bsar[:, None])
+        sig_sweat = np.maximum((371.2*err_cr[:, 0]) + (33.64*(wrms-clds)), 0) * bsar
+        e_sweat = _SKIN_SWEAT * sig_sweat[:, None] * self._sd_sweat * 2**((err_sk)/10)
+        wet = np.minimum(0.06 + 0.94*(e_sweat/e_max), 1)
+        e_sk = wet * e_max
+        e_sweat = (wet - 0.06) / 0.94 * e_max
+
+        # Skin blood flow [L/h]
+        sig_dilat = np.maximum((100.5*err_cr[:, 0]) + (6.4*(wrms-clds)), 0)
+        sig_stric = np.maximum((-10.8*err_cr[:, 0]) + (-10.8*(wrms-clds)), 0)
+        bf_sk = (1 + _SKIN_DILAT * self._sd_dilat * sig_dilat[:, None]) / \
+                (1 + _SKIN_STRIC * sig_stric[:, None]) * _BFB_SK * 2**(err_sk/6)
+        bf_sk *= bfbr[:, None]
+
+        # Hand, Foot AVA blood flow [L/h]
+        err_bcr = np.average(err_cr[:, 2:5], axis=1, weights=_CAP_BCR)
+        err_msk = np.average(err_sk, axis=1, weights=_BSAst)
+        sig_ava_hand = np.clip(0.265 * (err_msk + 0.43) + 0.953 * (err_bcr + 0.1905) + 0.9126, 0, 1)
+        sig_ava_foot = np.clip(0.265 * (err_msk - 0.997) + 0.953 * (err_bcr + 0.0095) + 0.9126, 0, 1)
+        bf_ava_hand = 1.71 * bfbr * sig_ava_hand
+        bf_ava_foot = 2.16 * bfbr * sig_ava_foot
+
+        # Thermogenesis by shivering [W]
+        sig_shiv = np.maximum(24.36 * clds * (-err_cr[:, 0]), 0)
+        if self._shiv_threshold.any():
+            # Threshold of starting shivering (Asaka, 2016)
+            tskm = np.average(tsk, axis=1, weights=_BSAst)
+            thres = np.where(tskm < 31, 36.6,
+                             np.where(self._male, -0.2436 * tskm + 44.10, -0.2250 * tskm + 43.05))
+            sig_shiv[self._shiv_threshold & (thres < tcr[:, 0])] = 0
+        limit = self._shiv_limit * dtime
+        dshiv = sig_shiv - self._pre_shiv
+        sig_shiv = np.where(dshiv > limit, limit + self._pre_shiv, sig_shiv)
+        sig_shiv = np.where(dshiv < -limit, -limit + self._pre_shiv, sig_shiv)
+        self._pre_shiv = sig_shiv
+        mshiv = _SHIVF * bsar[:, None] * self._sd_shiv[:, None] * sig_shiv[:, None]
+
+        # Thermogenesis by non-shivering [W]
+        sig_nst = np.minimum(2.8 * clds, self._nst_limit)
+        mnst = bsar[:, None] * _MNSTF * sig_nst[:, None]
+        mnst[~self._nst] = 0
+
+        #------------------------------------------------------------------
+        # Thermogenesis
+        #------------------------------------------------------------------
+        mbase_cr, mbase_ms, mbase_fat, mbase_sk = self._mbase
+        mwork = threg.local_mwork(self._mbase_all[:, None], self._par[:, None])
+        mextra = mwork + mshiv  # Muscle, or core in segments without muscle
+        qcr = mbase_cr + np.where(_MUSCLE, 0, mextra)
+        qms = mbase_ms + np.where(_MUSCLE, mextra, 0)
+        qcr += mnst
+        qfat = mbase_fat
+        qsk = mbase_sk
+        qall = qcr.sum(axis=1) + qms.sum(axis=1) + qfat.sum(axis=1) + qsk.sum(axis=1)
+
+        #------------------------------------------------------------------
+        # Other
+        #------------------------------------------------------------------
+        # Blood flow in core, muscle, fat [L/h]
+        bfb_cr, bfb_ms, bfb_fat = self._bfb
+        bf_cr = bfb_cr + np.where(_MUSCLE, 0, mextra/1.163)
+        bf_ms = bfb_ms + np.where(_MUSCLE, mextra/1.163, 0)
+        bf_fat = bfb_fat
+
+        # Heat loss by respiratory
+        res_sh, res_lh = threg.resp_heatloss(ta[:, 0], p_a[:, 0], qall)
+
+        #------------------------------------------------------------------
+        # Matrix
+        #------------------------------------------------------------------
+        # Conduction and blood flow of the entries only
+        flows = np.concatenate([bf_cr, bf_ms, bf_fat, bf_sk,
+                                bf_ava_hand[:, None], bf_ava_foot[:, None]], axis=1)
+        arr_tria = self._cdt_entries + flows.dot(self._bf_coef)
+        arr_tria *= dtime / self._cap[:, self._rows] # Change unit [W/K] to [-]
+
+        arrB = np.zeros((num, NUM_NODES))
+        arrB[:, INDEX["skin"]] += 1/r_t*self._bsa
+        arrB /= self._cap # Change unit [W/K] to [/sec]
+        arrB *= dtime # Change unit [/sec] to [-]
+
+        arrA = np.zeros((num, NUM_NODES*NUM_NODES))
+        arrA[:, self._entries] = -arr_tria
+        arrA[:, ::NUM_NODES+1] = arr_tria.dot(self._rowsum) + arrB + 1
+        arrA = arrA.reshape((num, NUM_NODES, NUM_NODES))
+
+        # Matrix Q [W] / [J/K] * [sec] = [-]
+        arrQ = np.zeros((num, NUM_NODES))
+        arrQ[:, INDEX["core"]] += qcr
+        arrQ[:, INDEX["muscle"]] += qms[:, VINDEX["muscle"]]
+        arrQ[:, INDEX["fat"]] += qfat[:, VINDEX["fat"]]
+        arrQ[:, INDEX["skin"]] += qsk
+        arrQ[:, INDEX["core"][2]] -= res_sh + res_lh #Chest core
+        arrQ[:, INDEX["skin"]] -= e_sk
+        arrQ += self.ex_q
+        arrQ /= self._cap # Change unit [W]/[J/K] to [K/sec]
+        arrQ *= dtime # Change unit [K/sec] to [K]
+
+        arr_to = np.zeros((num, NUM_NODES))
+        arr_to[:, INDEX["skin"]] += to
+        arr = self._bodytemp + arrB * arr_to + arrQ
+
+        #------------------------------------------------------------------
+        # New body temp. [oC]
+        #------------------------------------------------------------------
+        self._bodytemp = np.linalg.solve(arrA, arr[:, :, None])[:, :, 0]
+
+        #------------------------------------------------------------------
+        # Output paramters
+        #------------------------------------------------------------------
+        dictout = {}
+        if output:
+            # Sensible heat loss [W]
+            shlsk = (tsk - to) / r_t * self._bsa
+
+            # Cardiac output [L/h]
+            co = (bf_cr.sum(axis=1) + bf_ms.sum(axis=1) + bf_fat.sum(axis=1)
+                  + bf_sk.sum(axis=1) + 2*bf_ava_hand + 2*bf_ava_foot)
+
+            # Weight loss rate by evaporation [g/sec]
+            wlesk = (e_sweat + 0.06*e_max) / 2418
+            wleres = res_lh / 2418
+
+            dictout["CycleTime"] = self._cycle
+            dictout["ModTime"] = self._t
+            dictout["dt"] = dtime
+            dictout["TskMean"] = self.TskMean
+            dictout["Tsk"] = self.Tsk
+            dictout["Tcr"] = self.Tcr
+            dictout["WetMean"] = np.average(wet, axis=1, weights=_BSAst)
+            dictout["Wet"] = wet
+            dictout["Wle"] = (wlesk.sum(axis=1) + wleres)
+            dictout["CO"] = co
+            dictout["Met"] = qall
+            dictout["RESsh"] = res_sh
+            dictout["RESlh"] = res_lh
+            dictout["SHLsk"] = shlsk
+            dictout["LHLsk"] = e_sk
+            dictout["wESweat"] = wlesk
+        return dictout
+
+
+    def _fixed_hc(self, tsk):
+        """
+        Convective heat transfer coefficients [W/K.m2] of the bodies, see threg.fixed_hc.
+        """
+        ta, va = self._ta, self._va
+        hc = np.empty((self.num, 17))
+        for posture in set(self._posture):
+            rows = np.array([p == posture for p in self._posture])
+            hc[rows] = threg.conv_coef(posture, va[rows], ta[rows], tsk[rows])
+        mean_hc = np.average(hc, axis=1, weights=_BSAst)
+        mean_va = np.average(va, axis=1, weights=_BSAst)
+        mean_hc_whole = np.maximum(3, 8.600001*(mean_va**0.53))
+        return hc * mean_hc_whole[:, None] / mean_hc[:, None]
+
+
+    def dict_results(self, last=None):
+        """
+        Get the results as arrays of (steps, M, ...) by output parameter,
+        only of the last steps if last is set.
+        """
+        if not self._history:
+            print("The model has no data.")
+            return None
+        return self._history.columns(last=last)
+
+
+    def _batch_array(self, inp):
+        """
+        Make ndarray (M, 17) of a float, a list (17,) or an array (M, 17).
+        """
+        return np.broadcast_to(np.asarray(inp, dtype=float), (self.num, 17)).copy()
+
+    @property
+    def Ta(self):
+        return self._ta
+    @Ta.setter
+    def Ta(self, inp):
+        self._ta = self._batch_array(inp)
+
+    @property
+    def Tr(self):
+        return self._tr
+    @Tr.setter
+    def Tr(self, inp):
+        self._tr = self._batch_array(inp)
+
+    @property
+    def To(self):
+        return threg.operative_temp(self._ta, self._tr, self._fixed_hc(self.Tsk), self._hr)
+    @To.setter
+    def To(self, inp):
+        self._ta = self._batch_array(inp)
+        self._tr = self._batch_array(inp)
+
+    @property
+    def RH(self):
+        return self._rh
+    @RH.setter
+    def RH(self, inp):
+        self._rh = self._batch_array(inp)
+
+    @property
+    def Va(self):
+        return self._va
+    @Va.setter
+    def Va(self, inp):
+        self._va = self._batch_array(inp)
+
+    @property
+    def Icl(self):
+        return self._clo
+    @Icl.setter
+    def Icl(self, inp):
+        self._clo = self._batch_array(inp)
+
+    @property
+    def PAR(self):
+        return self._par
+    @PAR.setter
+    def PAR(self, inp):
+        self._par = np.broadcast_to(np.asarray(inp, dtype=float), (self.num,)).copy()
+
+    @property
+    def bodytemp(self):
+        return self._bodytemp
+    @bodytemp.setter
+    def bodytemp(self, inp):
+        self._bodytemp = np.broadcast_to(np.asarray(inp, dtype=float), (self.num, NUM_NODES)).copy()
+
+    @property
+    def Tsk(self):
+        return self._bodytemp[:, INDEX["skin"]]
+
+    @property
+    def Tcr(self):
+        return self._bodytemp[:, INDEX["core"]]
+
+    @property
+    def TskMean(self):
+        return np.average(self.Tsk, axis=1, weights=_BSAst)
+
+
+class _BandSolver():
+    """
+    Band LU solver of the JOS-3 heat balance.
+
+    The matrix of a time step only has entries where nodes are connected by
+    conduction or blood flow (about 330 of 85x85). The nodes are reordered by
+    reverse Cuthill-McKee once, which turns every matrix with this pattern
+    into a band matrix (bandwidth 24 instead of 84), solved by LAPACK dgbsv.
+
+    Parameters
+    ----------
+    cdt : numpy.ndarray (85, 85)
+        Thermal conductance [W/K] of the body.
+    """
+    def __init__(self, cdt):
+        from scipy.linalg.lapack import dgbsv, dgbtrf, dgbtrs
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import reverse_cuthill_mckee
+
+        # All entries blood flow and conduction can produce
+        ones = np.ones(17)
+        bf_art, bf_vein = matrix.vessel_bloodflow(ones, ones, ones, ones, 1, 1)
+        pattern = ((cdt != 0)
+                   | (matrix.localarr(ones, ones, ones, ones, 1, 1) != 0)
+                   | (matrix.wholebody(bf_art, bf_vein, 1, 1) != 0))
+        pattern |= pattern.T | np.eye(NUM_NODES, dtype=bool)
+
+        order = reverse_cuthill_mckee(csr_matrix(pattern), symmetric_mode=True)
+        row, col = np.nonzero(pattern[np.ix_(order, order)])
+        self.lower = (row - col).max()
+        self.upper = (col - row).max()
+        self.order = order
+        # Gather from arrA and scatter into the LAPACK band storage
+        self._src = (order[row], order[col])
+        self._dst = (self.lower + self.upper + row - col, col)
+        self._dgbsv = dgbsv
+        self._dgbtrf = dgbtrf
+        self._dgbtrs = dgbtrs
+
+
+    def solve(self, arrA, arr):
+        """
+        Solve arrA @ x = arr.
+        """
+        ab = np.zeros((2*self.lower + self.upper + 1, NUM_NODES))
+        ab[self._dst] = arrA[self._src]
+        lub, piv, x, info = self._dgbsv(self.lower, self.upper, ab,
+                                        arr[self.order], overwrite_ab=1)
+        if info > 0:
+            raise np.linalg.LinAlgError("Singular matrix")
+        out = np.empty(NUM_NODES)
+        out[self.order] = x
+        return out
+
+
+    def factorize(self, arrA):
+        """
+        Factorize arrA, returns a function solving arrA @ x = arr for arr.
+        """
+        ab = np.zeros((2*self.lower + self.upper + 1, NUM_NODES))
+        ab[self._dst] = arrA[self._src]
+        lub, piv, info = self._dgbtrf(ab, self.lower, self.upper, overwrite_ab=1)
+        if info > 0:
+            raise np.linalg.LinAlgError("Singular matrix")
+
+        def solve(arr):
+            x, info = self._dgbtrs(lub, self.lower, self.upper, arr[self.order], piv)
+            out = np.empty(NUM_NODES)
+            out[self.order] = x
+            return out
+        return solve
+
+
+class _Detail():
+    """
+    Detailed output parameters of a step of JOS3 (ex_output).
+
+    A record keeps the intermediates of JOS3._run (raw): references to the
+    arrays computed anew in every step, and copies of the state and input
+    arrays the model keeps (bodytemp, To, Rt, Ta, ...), which can be
+    changed in place through the getters. The parameters of _DETAILS
+    are derived from them when the results are read, for all the steps at
+    once. Records of soaked states of a SoakLibrary keep the parameters
+    themselves (values).
+    """
+    __slots__ = ("raw", "values")
+
+    def __init__(self, raw=None, values=None):
+        self.raw = raw
+        self.values = values
+
+
+    def get(self, keys):
+        """
+        Parameters of the step by name.
+        """
+        if self.raw is None:
+            return {key: self.values[key] for key in keys if key in self.values}
+        out = {}
+        for key in keys:
+            name, index = _DETAILS[key]
+            value = self.raw[name]
+            out[key] = value if index is None else value[index]
+        return out
+
+
+    @staticmethod
+    def columns(records, keys):
+        """
+        Parameters of a column of records (None for the steps without
+        detailed output) as arrays of (steps,) or (steps, ...) by name.
+        """
+        if not keys:
+            return {}
+        if len(records) and all(type(record) is _Detail and record.raw is not None
+                                for record in records):
+            stacked = {}  # Intermediates of all the steps
+            columns = {}
+            for key in keys:
+                name, index = _DETAILS[key]
+                if name not in stacked:
+                    values = [record.raw[name] for record in records]
+                    column = np.array(values)
+                    if column.dtype.kind not in "biuf":
+                        column = np.array(values, dtype=object)
+                    stacked[name] = column
+                column = stacked[name]
+                columns[key] = column if index is None else column[:, index]
+            return columns
+
+        # Steps without records or with the values of soaked states
+        history = History(capacity=max(len(records), 1))
+        for record in records:
+            history.append({} if record is None else record.get(keys))
+        columns = history.columns()
+        return {key: columns[key] for key in keys if key in columns}
+
+
+class History():
+    """
+    Columnar history of the output parameters of JOS3 and JOS3Batch.
+
+    Every output parameter is kept in one preallocated NumPy array with a
+    row per step: (steps,) for scalars and (steps, 17) for values by body
+    segment. Parameters which are not numbers (ModTime, Name, ...) are kept
+    in object arrays. The arrays double when full, so appending a step is
+    amortized O(1). With maxlen, they are a ring buffer of the last steps.
+
+    Parameters
+    ----------
+    maxlen : int, optional
+        Number of the last steps kept. The default is None (all steps).
+    capacity : int, optional
+        Initial number of rows of the arrays. The default is 64.
+
+    Examples
+    -------
+    >>> history = History(maxlen=2)
+    >>> for i in range(3):
+    ...     history.append({"CycleTime": i, "Tsk": np.ones(17)*i})
+    >>> history.columns()["CycleTime"]
+    array([1, 2])
+    """
+    def __init__(self, maxlen=None, capacity=64):
+        if maxlen is not None and maxlen < 1:
+            raise ValueError("maxlen must be a positive integer.")
+        self.maxlen = maxlen
+        self._capacity = capacity if maxlen is None else min(capacity, maxlen)
+        self._columns = {}
+        self._types = {}  # Type of the last value by parameter
+        self._size = 0  # Rows in use
+        self._start = 0  # Row of the oldest step of the ring buffer
+        self.appended = 0  # Steps appended, including the dropped ones
+
+
+    def __len__(self):
+        return self._size
+
+
+    def append(self, dictout):
+        """
+        Add the output parameters of a step.
+        """
+        if self._size == self.maxlen:
+            row = self._start  # Overwrite the oldest step
+            self._start = (self._start + 1) % self.maxlen
+        else:
+            if self._size == self._capacity:
+                self._grow()
+            row = self._size
+            self._size += 1
+        self.appended += 1
+
+        types = self._types
+        for key, value in dictout.items():
+            column = self._columns.get(key)
+            # Same type as the last value: store it without converting
+            if column is not None and type(value) is types[key] and (
+                    type(value) is not np.ndarray
+                    or (value.dtype == column.dtype and value.shape == column.shape[1:])):
+                column[row] = value
+                continue
+            types[key] = type(value)
+            value = np.asarray(value)
+            if column is None:
+                column = self._new_column(key, value)
+            elif column.dtype != object and (value.dtype.kind not in "biuf"
+                    or np.result_type(column.dtype, value.dtype) != column.dtype):
+                column = self._promote(key, np.result_type(column.dtype, value.dtype)
+                                       if value.dtype.kind in "biuf" else object)
+            if value.shape != column.shape[1:]:
+                raise ValueError("The shape of {} changed from {} to {}.".format(
+                        key, column.shape[1:], value.shape))
+            column[row] = value.item() if column.dtype == object and not value.ndim else value
+        if len(dictout) < len(self._columns):
+            for key in self._columns.keys() - dictout.keys():
+                column, missing = self._missing(key)
+                column[row] = missing
+
+
+    def columns(self, keys=None, last=None, start=None, stop=None):
+        """
+        Get the parameters as arrays in the order of the steps.
+
+        Parameters
+        ----------
+        keys : list, optional
+            Names of the parameters. The default is None (all).
+        last : int, optional
+            Only the last steps. The default is None (all kept steps).
+        start, stop : int, optional
+            Range of the kept steps (0 is the oldest), as in a slice.
+            The default is None (all kept steps).
+
+        Returns
+        -------
+        columns : dict
+            Arrays of (steps,) or (steps, ...) by parameter.
+        """
+        if keys is None:
+            keys = self._columns.keys()
+        lower, upper, step = slice(start, stop).indices(self._size)
+        if last is not None:
+            lower = max(lower, upper - max(last, 0))
+        num = max(upper - lower, 0)
+        first = (self._start + lower) % self._size if self._size else 0
+        columns = {}
+        for key in keys:
+            column = self._columns[key]
+            if first + num <= self._size:
+                columns[key] = column[first:first+num].copy()
+            else:  # Wraps around the end of the ring buffer
+                columns[key] = np.concatenate([column[first:self._size], column[:first+num-self._size]])
+        return columns
+
+
+    def shapes(self):
+        """
+        Shapes of the values by parameter, e.g. (17,) for values by segment.
+        """
+        return {key: column.shape[1:] for key, column in self._columns.items()}
+
+
+    def clear(self):
+        """
+        Remove all steps.
+        """
+        self._columns = {}
+        self._types = {}
+        self._size = 0
+        self._start = 0
+
+
+    def _grow(self):
+        """
+        Double the rows of the arrays (up to maxlen).
+        """
+        capacity = 2 * self._capacity
+        if self.maxlen is not None:
+            capacity = min(capacity, self.maxlen)
+        for key, column in self._columns.items():
+            grown = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._columns[key] = grown
+        self._capacity = capacity
+
+
+    def _new_column(self, key, value):
+        """
+        Array for a parameter, filled with missing values for the previous steps.
+        """
+        dtype = value.dtype if value.dtype.kind in "biuf" else object
+        column = np.empty((self._capacity,) + value.shape, dtype=dtype)
+        self._columns[key] = column
+        if self._size > 1:
+            column, missing = self._missing(key)
+            column[:self._size] = missing
+        return column
+
+
+    def _missing(self, key):
+        """
+        Array of a parameter which can hold missing values, and the missing
+        value (nan for numbers, None for objects).
+        """
+        column = self._columns[key]
+        if column.dtype.kind == "b":
+            column = self._promote(key, object)
+        elif column.dtype.kind in "iu":
+            column = self._promote(key, float)
+        return column, (np.nan if column.dtype.kind == "f" else None)
+
+
+    def _promote(self, key, dtype):
+        """
+        Change the dtype of the array of a parameter.
+        """
+        self._columns[key] = self._columns[key].astype(dtype)
+        return self._columns[key]
+
+
+class ResultWriter():
+    """
+    Export of the results of JOS3 in chunks, while simulating or afterwards.
+
+    Every write takes the steps recorded since the last write from the
+    history of the model, chunksize steps at a time, so the memory needed
+    scales with chunksize and not with the length of the run. To bound the
+    memory of a long run, limit the history as well, e.g.
+    JOS3(max_history=chunksize), and attach the writer to the model. An
+    attached writer also writes when the history is full of steps not
+    written yet, so no step is dropped before it is written.
+
+    The format follows the extension of path:
+
+    ".csv" or ".txt" : csv, with the unit and meaning rows of JOS3.to_csv.
+    ".npz" : one array per column, and "__columns__", "__units__" and
+        "__meanings__" as string arrays.
+    ".parquet" : one row group per chunk (requires pyarrow), with "unit"
+        and "meaning" in the metadata of every field.
+    no extension : a folder with one memory-mappable .npy file per column
+        (np.load(path, mmap_mode="r")) and metadata.json.
+
+    Numbers are written as float64 to the binary formats, ModTime in seconds.
+    The npz file and the .npy files are completed by close().
+
+    Parameters
+    ----------
+    path : str
+        Output file (or folder).
+    model : JOS3, optional
+        Attach the writer to the model: simulate writes every chunksize
+        steps and close writes the rest. The default is None.
+    chunksize : int, optional
+        Steps written at a time. The default is 1000.
+    unit, meaning : bool, optional
+        Write the units and meanings of the parameters. The default is True.
+
+    Examples
+    -------
+    >>> model = jos3.JOS3(ex_output="all", max_history=1000)
+    >>> with jos3.ResultWriter("run.parquet", model, chunksize=1000):
+    ...     model.simulate(100000, 60)
+    """
+    def __init__(self, path, model=None, chunksize=1000, unit=True, meaning=True):
+        self.path = path
+        self.chunksize = chunksize
+        self.unit = unit
+        self.meaning = meaning
+        self.written = None  # Steps of the history written (History.appended)
+        self.rows = 0  # Rows written
+        self.columns = None
+        ext = os.path.splitext(path)[1].lower()
+        self.format = {".csv": "csv", ".txt": "csv", ".npz": "npz",
+                       ".parquet": "parquet", "": "npy"}.get(ext)
+        if self.format is None:
+            raise ValueError("Unknown format of {}, use .csv, .txt, .npz, .parquet or a folder.".format(path))
+        if self.format == "parquet":
+            import pyarrow  # Fails early if pyarrow is missing
+        self._file = None
+        self.model = model
+        if model is not None:
+            model._writer = self
+            # Start at the oldest kept step, the later ones are written before they are dropped
+            self.written = model._history.appended - len(model._history)
+            self._simulated(model)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+    def _simulated(self, model):
+        """
+        Write if a chunk of steps is pending, or if the next step would drop
+        a step not written from a history with max_history, called by
+        JOS3.simulate.
+        """
+        history = model._history
+        written = history.appended - len(history) if self.written is None else self.written
+        pending = history.appended - written
+        if pending >= self.chunksize or (history.maxlen is not None and pending >= history.maxlen):
+            self.write(model)
+
+
+    def write(self, model=None):
+        """
+        Write the steps recorded since the last write.
+
+        Parameters
+        ----------
+        model : JOS3, optional
+            The model. The default is None (the attached model).
+        """
+        model = self.model if model is None else model
+        history = model._history
+        if self.written is None:
+            self.written = history.appended - len(history)  # Start at the oldest kept step
+        start = len(history) - (history.appended - self.written)
+        if start < 0:
+            raise RuntimeError("{} steps were dropped from the history before they were "
+                               "written; write more often or increase max_history.".format(-start))
+        for lower in range(start, len(history), self.chunksize):
+            upper = min(lower + self.chunksize, len(history))
+            self._write_chunk(model._flatten(model._columns(start=lower, stop=upper)))
+            self.written += upper - lower
+
+
+    def close(self):
+        """
+        Write the remaining steps of the attached model and complete the file.
+        """
+        if self.model is not None:
+            self.write()
+            if self.model._writer is self:
+                self.model._writer = None
+            self.model = None
+        if self._file is not None:
+            getattr(self, "_close_" + self.format)()
+            self._file = None
+
+
+    def _write_chunk(self, outdict):
+        """
+        Write the columns of a chunk.
+        """
+        if self.columns is None:
+            self.columns = list(outdict)
+            self.units, self.meanings = _units_meanings(self.columns)
+            getattr(self, "_open_" + self.format)(outdict)
+        elif list(outdict) != self.columns:
+            raise ValueError("The output parameters changed during the export to {}.".format(self.path))
+        getattr(self, "_write_" + self.format)(outdict)
+        self.rows += len(outdict[self.columns[0]])
+
+
+    @staticmethod
+    def _numbers(values):
+        """
+        Values as float64 array, ModTime in seconds, or as str array.
+        """
+        if values.dtype != object:
+            return values.astype(float)
+        if all(isinstance(v, dt.timedelta) for v in values):
+            return np.array([v.total_seconds() for v in values])
+        return values.astype(str)
+
+
+    # csv
+    def _open_csv(self, outdict):
+        self._file = open(self.path, "wt", newline="")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(self.columns)
+        if self.unit: self._csv.writerow(self.units)
+        if self.meaning: self._csv.writerow(self.meanings)
+
+    def _write_csv(self, outdict):
+        self._csv.writerows(zip(*[outdict[k].tolist() for k in self.columns]))
+
+    def _close_csv(self):
+        self._file.close()
+
+
+    # Parquet, the schema is taken from the first chunk
+    def _open_parquet(self, outdict):
+        import pyarrow
+        import pyarrow.parquet
+        fields = []
+        for k, unit, meaning in zip(self.columns, self.units, self.meanings):
+            metadata = {}
+            if self.unit: metadata["unit"] = unit
+            if self.meaning: metadata["meaning"] = meaning
+            values = pyarrow.array(self._numbers(outdict[k]))
+            fields.append(pyarrow.field(k, values.type, metadata=metadata))
+        self._schema = pyarrow.schema(fields)
+        self._file = pyarrow.parquet.ParquetWriter(self.path, self._schema)
+
+    def _write_parquet(self, outdict):
+        import pyarrow
+        columns = [pyarrow.array(self._numbers(outdict[k])) for k in self.columns]
+        self._file.write_table(pyarrow.Table.from_arrays(columns, schema=self._schema))
+
+    def _close_parquet(self):
+        self._file.close()
+
+
+    # npz and the folder of .npy files, staged as raw data by column
+    def _open_npz(self, outdict):
+        self._stage = self.path + ".parts"
+        os.makedirs(self._stage, exist_ok=True)
+        self._file = []
+        self._numeric = []
+        for i, k in enumerate(self.columns):
+            numeric = self._numbers(outdict[k]).dtype.kind == "f"
+            self._numeric.append(numeric)
+            self._file.append(open(os.path.join(self._stage, str(i)), "wb" if numeric else "wt"))
+
+    def _open_npy(self, outdict):
+        os.makedirs(self.path, exist_ok=True)
+        self._open_npz(outdict)
+
+    def _write_npz(self, outdict):
+        for i, k in enumerate(self.columns):
+            values = self._numbers(outdict[k])
+            if self._numeric[i]:
+                self._file[i].write(values.astype("<f8").tobytes())
+            else:  # Strings, one per line
+                self._file[i].writelines(str(v).replace("\n", " ") + "\n" for v in values)
+
+    _write_npy = _write_npz
+
+    def _stage_arrays(self):
+        """
+        Yield the column names, .npy headers and chunks of the staged data.
+        """
+        for i, k in enumerate(self.columns):
+            self._file[i].close()
+            part = os.path.join(self._stage, str(i))
+            if self._numeric[i]:
+                header = {"descr": "<f8", "fortran_order": False, "shape": (self.rows,)}
+                with open(part, "rb") as f:
+                    yield k, header, iter(lambda: f.read(1 << 20), b"")
+            else:
+                with open(part, "rt") as f:
+                    width = max([len(line) - 1 for line in f] + [1])
+                header = {"descr": "<U{}".format(width), "fortran_order": False, "shape": (self.rows,)}
+                def chunks():
+                    with open(part, "rt") as f:
+                        lines = []
+                        for line in f:
+                            lines.append(line[:-1])
+                            if len(lines) == self.chunksize:
+                                yield np.array(lines, dtype=header["descr"]).tobytes()
+                                lines = []
+                        yield np.array(lines, dtype=header["descr"]).tobytes()
+                yield k, header, chunks()
+            os.remove(part)
+        os.rmdir(self._stage)
+
+    @staticmethod
+    def _write_array(f, header, chunks):
+        np.lib.format.write_array_header_1_0(f, header)
+        for chunk in chunks:
+            f.write(chunk)
+
+    def _close_npz(self):
+        import zipfile
+        with zipfile.ZipFile(self.path, "w") as z:
+            for k, header, chunks in self._stage_arrays():
+                with z.open(k + ".npy", "w", force_zip64=True) as f:
+                    self._write_array(f, header, chunks)
+            for k, values in (("__columns__", self.columns), ("__units__", self.units),
+                              ("__meanings__", self.meanings)):
+                with z.open(k + ".npy", "w") as f:
+                    np.lib.format.write_array(f, np.array(values, dtype=str))
+
+    def _close_npy(self):
+        import json
+        for k, header, chunks in self._stage_arrays():
+            with open(os.path.join(self.path, k + ".npy"), "wb") as f:
+                self._write_array(f, header, chunks)
+        metadata = {"columns": self.columns, "rows": self.rows}
+        if self.unit: metadata["units"] = dict(zip(self.columns, self.units))
+        if self.meaning: metadata["meanings"] = dict(zip(self.columns, self.meanings))
+        with open(os.path.join(self.path, "metadata.json"), "w") as f:
+            json.dump(metadata, f, indent=1)
+
+
+def _units_meanings(columns):
+    """
+    Units and meanings of the result columns from ALL_OUT_PARAMS.
+    """
+    units = []
+    meanigs = []
+    for col in columns:
+        param, rbn = remove_bodyname(col)
+        if param in ALL_OUT_PARAMS:
+            u = ALL_OUT_PARAMS[param]["unit"]
+            units.append(u)
+
+            m = ALL_OUT_PARAMS[param]["meaning"]
+            if rbn:
+                meanigs.append(m.replace("body part", rbn))
+            else:
+                meanigs.append(m)
+        else:
+            units.append("")
+            meanigs.append("")
+    return units, meanigs
+
+
+class SetptCache():
+    """
+    Cache of the setpoint temperatures of JOS-3, keyed by the anthropometrics
+    (height, weight, fat, age, sex, ci, bmr_equation and bsa_equation).
+
+    The entries are kept in an in-memory LRU and, if a folder is set, in one
+    .npz file per body so they can be shared between runs and processes.
+    An entry holds the setpoint temperatures and the body temperatures
+    before the last steady iteration.
+
+    Parameters
+    ----------
+    folder : str, optional
+        Folder of the on-disk store. The default is None (memory only).
+    maxsize : int, optional
+        Number of entries kept in memory. The default is 128.
+
+    Examples
+    -------
+    >>> import jos3
+    >>> cache = jos3.SetptCache(folder="setpt_cache")
+    >>> model = jos3.JOS3(height=1.8, weight=75, age=30, setpt_cache=cache)
+    >>> cache.verify()  # Compare the cached setpoints with a fresh solve
+    """
+    def __init__(self, folder=None, maxsize=128):
+        self.folder = folder
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()  # The models of several threads can share a cache
+
+
+    @staticmethod
+    def key(model):
+        """
+        Cache key of a model.
+
+        Returns
+        -------
+        key : tuple
+            (height, weight, fat, age, sex, ci, bmr_equation, bsa_equation)
+        """
+        return (float(model._height), float(model._weight), float(model._fat),
+                float(model._age), model._sex, float(model._ci),
+                model._bmr_equation, model._bsa_equation)
+
+
+    def _path(self, key):
+        name = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.folder, name + ".npz")
+
+
+    def get(self, key):
+        """
+        Get an entry from memory or from the folder.
+
+        Returns
+        -------
+        entry : dict or None
+            None if the body is not in the cache.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        if self.folder:
+            try:
+                with np.load(self._path(key)) as data:
+                    entry = {k: data[k] for k in ("bodytemp", "setpt_cr", "setpt_sk")}
+            except (OSError, KeyError, ValueError):
+                entry = None
+            if entry is not None:
+                with self._lock:
+                    self._remember(key, entry)
+                    self.hits += 1
+                return entry
+        with self._lock:
+            self.misses += 1
+        return None
+
+
+    def put(self, key, entry):
+        """
+        Add an entry to memory and to the folder.
+        """
+        with self._lock:
+            self._remember(key, entry)
+        if self.folder:
+            os.makedirs(self.folder, exist_ok=True)
+            path = self._path(key)
+            tmp = "{}.{}.{}.tmp.npz".format(path[:-4], os.getpid(), threading.get_ident())
+            np.savez(tmp, **entry)
+            os.replace(tmp, path)  # atomic, other processes never see a partial file
+
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+    def clear(self):
+        """
+        Clear the in-memory entries. The folder is not touched.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+    def verify(self, atol=1e-8):
+        """
+        Compare the setpoint temperatures in memory with a fresh solve.
+
+        Parameters
+        ----------
+        atol : float, optional
+            Absolute tolerance [oC]. The default is 1e-8.
+
+        Returns
+        -------
+        bool
+            True if all the cached setpoints match.
+        """
+        for key, entry in list(self._entries.items()):
+            height, weight, fat, age, sex, ci, bmr_equation, bsa_equation = key
+            model = JOS3(height=height, weight=weight, fat=fat, age=age,
+                         sex=sex, ci=ci, bmr_equation=bmr_equation,
+                         bsa_equation=bsa_equation)
+            if not (np.allclose(model.setpt_cr, entry["setpt_cr"], rtol=0, atol=atol)
+                    and np.allclose(model.setpt_sk, entry["setpt_sk"], rtol=0, atol=atol)):
+                return False
+        return True
+
+
+# Module cache used by JOS3(setpt_cache=True)
+SETPT_CACHE = SetptCache()
+
+
+class SoakLibrary():
+    """
+    Library of soaked body states (see JOS3.soak), reused across runs.
+
+    The states are grouped by the body (the SetptCache key), posture,
+    PAR, clothing, air velocity, options, output parameters, soak time
+    and, for a transient soak, the initial body temperatures. Within a
+    group they are keyed by the ambient conditions (Ta, Tr, RH).
+    Each state is kept in memory and, if a folder is set, in one .npz file
+    per state in one sub-folder per group.
+
+    If interpolate is True and the ambient conditions are uniform over the
+    body, a missing state is interpolated multilinearly in (Ta, Tr, RH)
+    between the neighbouring states of the group, or in (Ta, RH) if there
+    are states with the same Tr - Ta.
+
+    Parameters
+    ----------
+    folder : str, optional
+        Folder of the on-disk library. The default is None (memory only).
+    interpolate : bool, optional
+        Interpolate between neighbouring states. The default is False.
+
+    Examples
+    -------
+    >>> library = jos3.SoakLibrary(folder="soak_library", interpolate=True)
+    >>> model = jos3.JOS3(setpt_cache=True)
+    >>> model.Ta = model.Tr = -10
+    >>> model.soak(300, library=library)
+    """
+    def __init__(self, folder=None, interpolate=False):
+        self.folder = folder
+        self.interpolate = interpolate
+        self.hits = 0
+        self.misses = 0
+        self.interpolated = 0
+        self._groups = {}
+
+
+    @staticmethod
+    def key(model, time):
+        """
+        Library key of the soak of a model.
+
+        Returns
+        -------
+        key : tuple
+            (group, ambient), ambient is ((17,) Ta, (17,) Tr, (17,) RH).
+        """
+        group = SetptCache.key(model) + (
+                model._posture, float(model._par), tuple(model._clo),
+                tuple(model._va), tuple(sorted(model.options.items())),
+                repr(model._ex_output), time)
+        if time is not None:
+            group += (hashlib.sha1(model._bodytemp.tobytes()).hexdigest(),)
+        ambient = (tuple(model._ta), tuple(model._tr), tuple(model._rh))
+        return group, ambient
+
+
+    def _folder(self, group):
+        return os.path.join(self.folder, hashlib.sha1(repr(group).encode()).hexdigest())
+
+
+    def _path(self, group, ambient):
+        name = hashlib.sha1(repr(ambient).encode()).hexdigest()
+        return os.path.join(self._folder(group), name + ".npz")
+
+
+    def get(self, key):
+        """
+        Get a soaked state from memory, the folder or by interpolation.
+
+        Returns
+        -------
+        entry : dict or None
+            "bodytemp" and "record" (output parameters of the soak).
+        """
+        group, ambient = key
+        entries = self._groups.setdefault(group, {})
+        if ambient not in entries and self.folder:
+            entry = self._load(self._path(group, ambient))
+            if entry is not None:
+                entries[ambient] = entry
+        if ambient in entries:
+            self.hits += 1
+            return entries[ambient]
+        if self.interpolate:
+            entry = self._interpolate(group, ambient)
+            if entry is not None:
+                self.interpolated += 1
+                return entry
+        self.misses += 1
+        return None
+
+
+    def put(self, key, bodytemp, dictout):
+        """
+        Add a soaked state to memory and to the folder.
+        """
+        group, ambient = key
+        entry = {"bodytemp": bodytemp.copy(), "record": dict(dictout)}
+        self._groups.setdefault(group, {})[ambient] = entry
+        if self.folder:
+            os.makedirs(self._folder(group), exist_ok=True)
+            path = self._path(group, ambient)
+            arrays = {"ambient": np.array(ambient), "bodytemp": bodytemp}
+            for k, v in dictout.items():
+                if isinstance(v, dt.timedelta):
+                    v = v.total_seconds()
+                arrays["out_" + k] = np.asarray(v)
+            tmp = "{}.{}.{}.tmp.npz".format(path[:-4], os.getpid(), threading.get_ident())
+            np.savez(tmp, **arrays)
+            os.replace(tmp, path)  # atomic, other processes never see a partial file
+
+
+    @staticmethod
+    def _load(path):
+        try:
+            with np.load(path) as data:
+                record = {}
+                for k in data.files:
+                    if k[:4] == "out_":
+                        v = data[k]
+                        record[k[4:]] = v.item() if v.ndim == 0 else v
+                return {"bodytemp": data["bodytemp"], "record": record,
+                        "ambient": tuple(tuple(a) for a in data["ambient"])}
+        except (OSError, KeyError, ValueError):
+            return None
+
+
+    def _interpolate(self, group, ambient):
+        """
+        Multilinear interpolation in (Ta, Tr, RH) between the states of a group.
+        """
+        point = _uniform(ambient)
+        if point is None:
+            return None
+        entries = self._groups[group]
+        if self.folder and os.path.isdir(self._folder(group)):
+            for name in os.listdir(self._folder(group)):
+                if name.endswith(".npz") and ".tmp." not in name:
+                    entry = self._load(os.path.join(self._folder(group), name))
+                    if entry is not None:
+                        entries.setdefault(entry["ambient"], entry)
+        grid = {}
+        for amb, entry in entries.items():
+            coords = _uniform(amb)
+            if coords is not None:
+                grid[coords] = entry
+
+        # Tr usually follows Ta; then interpolate in (Ta, RH) between the
+        # states with the same Tr - Ta
+        offset = point[1] - point[0]
+        tied = {(c[0], c[2]): e for c, e in grid.items()
+                if abs(c[1] - c[0] - offset) < 1e-9}
+        if tied:
+            grid = tied
+            point = (point[0], point[2])
+        if not grid:
+            return None
+
+        # Neighbouring grid values and weights in each dimension
+        brackets = []
+        for i, x in enumerate(point):
+            values = sorted(set(c[i] for c in grid))
+            lower = [v for v in values if v <= x]
+            upper = [v for v in values if v >= x]
+            if not lower or not upper:
+                return None
+            lo, hi = lower[-1], upper[0]
+            if lo == hi:
+                brackets.append([(lo, 1.0)])
+            else:
+                w = (x - lo) / (hi - lo)
+                brackets.append([(lo, 1 - w), (hi, w)])
+
+        corners = [((), 1.0)]
+        for bracket in brackets:
+            corners = [(c + (v,), w * wv) for c, w in corners for v, wv in bracket]
+        if any(c not in grid for c, w in corners):
+            return None
+
+        first = grid[corners[0][0]]
+        bodytemp = sum(w * grid[c]["bodytemp"] for c, w in corners)
+        record = {}
+        for k, v in first["record"].items():
+            if isinstance(v, (str, dt.timedelta)):
+                record[k] = v
+            else:
+                record[k] = sum(w * np.asarray(grid[c]["record"][k]) for c, w in corners)
+        return {"bodytemp": bodytemp, "record": record}
+
+
+def _uniform(ambient):
+    """
+    (Ta, Tr, RH) of ambient conditions that are uniform over the body, else None.
+    """
+    coords = []
+    for values in ambient:
+        if min(values) != max(values):
+            return None
+        coords.append(values[0])
+    return tuple(coords)
+
+
+class Sweep():
+    """
+    Parameter sweep of JOS3 scenarios over a process pool.
+
+    A scenario is a dict of the arguments of JOS3 (height, weight, age,
+    sex, ex_output, solver, ...), of the input conditions set before the
+    simulation (Ta, Tr, To, RH, Va, Icl, PAR, posture) and of options
+    updating JOS3.options. Every scenario is simulated for times steps of
+    dtime from its setpoint state.
+
+    The scenarios are sent to the worker processes in chunks. A worker
+    keeps its interpreter and a SetptCache for all its scenarios, so the
+    setpoints of a body are solved once per worker (once for all the
+    workers with setpt_folder).
+
+    The results have one row per scenario: "Scenario" (index), the
+    scenario ("Scenario_Ta", "Scenario_IclHead", ...), the output
+    parameters of the last step, "Elapsed" (time of the scenario in the
+    worker) [s] and "Worker" (process id). All the scenarios must give the
+    same output parameters (e.g. the same ex_output).
+
+    Parameters
+    ----------
+    scenarios : list of dict
+        Scenarios, e.g. from Sweep.grid.
+    times : int, optional
+        Number of steps of every scenario. The default is 60.
+    dtime : int or float, optional
+        Time delta [sec]. The default is 60.
+    fields : list, optional
+        Output parameters of the results, also detailed ones (see
+        ex_output). The default is None (the parameters recorded by
+        simulate).
+    processes : int, optional
+        Number of worker processes, 0 runs the scenarios in this process.
+        The default is None (the number of CPUs).
+    chunksize : int, optional
+        Scenarios sent to a worker at a time. The default is None (about
+        four chunks per worker).
+    setpt_folder : str, optional
+        Folder of the SetptCache shared by the workers. The default is
+        None (a cache in memory of every worker).
+
+    Examples
+    -------
+    >>> scenarios = jos3.Sweep.grid(Ta=range(10, 31), RH=[30, 50, 70], PAR=[1.2, 1.6])
+    >>> results = jos3.Sweep(scenarios, times=60).run("sweep.parquet")
+    >>> results["TskMean"].shape
+    (126,)
+    """
+    # JOS3 arguments of a scenario, the other entries are input conditions
+    ARGUMENTS = ("height", "weight", "fat", "age", "sex", "ci", "bmr_equation",
+                 "bsa_equation", "ex_output", "solver", "reuse_tol", "integrator",
+                 "propagator_tol")
+    INPUTS = ("Ta", "Tr", "To", "RH", "Va", "Icl", "PAR", "posture", "options")
+
+    def __init__(self, scenarios, times=60, dtime=60, fields=None, processes=None,
+                 chunksize=None, setpt_folder=None):
+        self.scenarios = list(scenarios)
+        for scenario in self.scenarios:
+            unknown = set(scenario) - set(self.ARGUMENTS) - set(self.INPUTS)
+            if unknown:
+                raise ValueError("Unknown scenario parameters {}.".format(sorted(unknown)))
+        if fields is not None:
+            unknown = [key for key in fields if key not in _OUTPUTS and key not in _DETAILS]
+            if unknown:
+                raise ValueError("Unknown output parameters {}.".format(unknown))
+        self.times = times
+        self.dtime = dtime
+        self.fields = fields
+        self.processes = os.cpu_count() if processes is None else processes
+        if chunksize is None:
+            chunksize = max(1, len(self.scenarios) // (4 * max(self.processes, 1)))
+        self.chunksize = chunksize
+        self.setpt_folder = setpt_folder
+
+
+    @staticmethod
+    def grid(**axes):
+        """
+        Scenarios of all the combinations of the values of the parameters.
+
+        Examples
+        -------
+        >>> jos3.Sweep.grid(Ta=[20, 30], PAR=[1.2, 1.6])
+        [{'Ta': 20, 'PAR': 1.2}, {'Ta': 20, 'PAR': 1.6}, {'Ta': 30, 'PAR': 1.2}, {'Ta': 30, 'PAR': 1.6}]
+        """
+        keys = list(axes)
+        return [dict(zip(keys, values)) for values in itertools.product(*axes.values())]
+
+
+    def run(self, path=None, unit=True, meaning=True):
+        """
+        Simulate all the scenarios.
+
+        Parameters
+        ----------
+        path : str, optional
+            Result store, written in chunks as the results come in, in a
+            format of ResultWriter (.csv, .npz, .parquet or a folder).
+            The default is None (only returned).
+        unit, meaning : bool, optional
+            Write the units and meanings of the parameters. The default is True.
+
+        Returns
+        -------
+        results : dict
+            Arrays of (scenarios,) by column title.
+        """
+        settings = (self.times, self.dtime, self.fields, self.setpt_folder)
+        items = enumerate(self.scenarios)
+        if self.processes:
+            from concurrent.futures import ProcessPoolExecutor
+            pool = ProcessPoolExecutor(self.processes, initializer=_sweep_init, initargs=(settings,))
+            rows = pool.map(_sweep_run, items, chunksize=self.chunksize)
+        else:
+            pool = None
+            _sweep_init(settings)
+            rows = map(_sweep_run, items)
+
+        inputs = self._inputs()
+        writer = None if path is None else ResultWriter(path, chunksize=self.chunksize,
+                                                        unit=unit, meaning=meaning)
+        chunks = []
+        try:
+            chunk = []
+            for row in itertools.chain(rows, [None]):  # None flushes the last chunk
+                if row is not None:
+                    chunk.append(row)
+                if chunk and (row is None or len(chunk) == self.chunksize):
+                    chunks.append(self._columns(chunk, inputs, len(chunks) * self.chunksize))
+                    if writer is not None:
+                        writer._write_chunk(chunks[-1])
+                    chunk = []
+        finally:
+            if pool is not None:
+                pool.shutdown()
+            if writer is not None:
+                writer.close()
+        if not chunks:
+            return {}
+        return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+
+    def _inputs(self):
+        """
+        Columns of the scenarios, missing values are nan (or None).
+        """
+        # Input conditions by segment in any scenario are (17,) in all
+        segments = set(key for scenario in self.scenarios for key, value in scenario.items()
+                       if key in self.INPUTS and np.ndim(value) == 1)
+        history = History(capacity=max(len(self.scenarios), 1))
+        for scenario in self.scenarios:
+            row = {}
+            for key, value in scenario.items():
+                if isinstance(value, dict) or key == "ex_output":
+                    value = repr(value)
+                elif key in segments:
+                    value = _to17array(value)
+                row[key] = value
+            history.append(row)
+        columns = {}
+        for key, column in history.columns().items():
+            if column.ndim == 1:
+                columns["Scenario_" + key] = column
+            else:
+                names = BODY_NAMES if column.shape[1] == 17 else range(column.shape[1])
+                for name, values in zip(names, column.T):
+                    columns["Scenario_{}{}".format(key, name)] = values
+        return columns
+
+
+    @staticmethod
+    def _columns(chunk, inputs, first):
+        """
+        Columns of a chunk of rows of _sweep_run.
+        """
+        columns = {"Scenario": np.array([index for index, row, elapsed, pid in chunk])}
+        for key, values in inputs.items():
+            columns[key] = values[first:first+len(chunk)]
+        for key in chunk[0][1]:
+            columns[key] = np.concatenate([row[key] for index, row, elapsed, pid in chunk])
+        columns["Elapsed"] = np.array([elapsed for index, row, elapsed, pid in chunk])
+        columns["Worker"] = np.array([pid for index, row, elapsed, pid in chunk])
+        return columns
+
+
+# Settings and SetptCache of the sweep in a worker process, see _sweep_init
+_SWEEP = None
+
+
+def _sweep_init(settings):
+    """
+    Keep the settings of a Sweep and a SetptCache of its own in a worker
+    process (or in this process, with processes=0).
+    """
+    global _SWEEP
+    _SWEEP = settings + (SetptCache(folder=settings[3]),)
+
+
+def _sweep_run(item):
+    """
+    Simulate a scenario of a Sweep.
+
+    Returns
+    -------
+    (index, outputs, elapsed, pid)
+        outputs are arrays of (1,) by column title of the last step.
+    """
+    index, scenario = item
+    times, dtime, fields, folder, cache = _SWEEP
+    start = time.perf_counter()
+    arguments = {key: value for key, value in scenario.items() if key in Sweep.ARGUMENTS}
+    if fields is not None and "ex_output" not in arguments:
+        # Record the detailed parameters of the fields
+        arguments["ex_output"] = [key for key in fields if key in _DETAILS] or None
+    model = JOS3(setpt_cache=cache, **arguments)
+    for key, value in scenario.items():
+        if key == "options":
+            model.options.update(value)
+        elif key in Sweep.INPUTS:
+            setattr(model, key, value)
+    model.simulate(times, dtime, output="last")
+    outputs = model._flatten(model._columns(fields, last=1))
+    return index, outputs, time.perf_counter() - start, os.getpid()
+
+
 def _to17array(inp):
     """
     Make ndarray (17,).
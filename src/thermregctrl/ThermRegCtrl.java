@@ -47,6 +47,9 @@ String invalidCriteriaCab = "{ \'functionEnabled\': false,"
 
 RecircControl recircControl;
 CabHeater cabHeater;
+Process coSim;
+BufferedWriter coSimInput;
+BufferedReader coSimOutput;
 DecimalFormat dfTime = new DecimalFormat("#####0.0");
 @Override
 @SuppressWarnings("empty-statement")
@@ -119,6 +122,13 @@ simulation_0.println("=====> Total time to Run = " + dfTime.format((System.nanoT
         double timeStepTransient = (simulation_0.getSolverManager().getSolver(ImplicitUnsteadySolver.class).getTimeStep().evaluate());
         boolean srhSwitch = false;
         
+        try {
+            StartCoSim();
+        }
+        catch (IOException e) {
+            simulation_0.println("error");
+        }
+        
         while(simulation_0.getSolution().getPhysicalTime()<stopTime.getMaximumTime().getSIValue()){            
             String s;
             if (simulation_0.getSolution().getPhysicalTime()>30.0 && ((!srhSwitch) && (srh))){
@@ -134,25 +144,12 @@ simulation_0.println("=====> Total time to Run = " + dfTime.format((System.nanoT
             // Set skin temperatures based on the human model
             try {
                 /*
-                When the fixedTime has completed, the python model named 'CoSim.py' is executed. Read documentation in the file.
+                When the fixedTime has completed, the python model named 'CoSim.py' advances one coupling step. Read documentation in the file.
                 */
                   simulation_0.println("======Updating human model====");
-                  String dir = simulation_0.getSessionDir(); //get the name of the directory
-                  String sep = System.getProperty("file.separator"); //get the right separator for your operative system
-                  String [] cmd = new String[3];
-                  cmd[0] = "python3"; // Build string to be read by the exec() method - "python pathToScript"
-                  cmd[1] = "CoSim.py";
                   double timeStep = (simulation_0.getSolverManager().getSolver(ImplicitUnsteadySolver.class).getTimeStep().evaluate());
-                  cmd[2] = Double.toString(timeStep);
-                  Process p = Runtime.getRuntime().exec(cmd);                 
-                  //Read output from Python script
-		  BufferedReader stdInput = new BufferedReader(new InputStreamReader(p.getInputStream()));
-		  BufferedReader stdError = new BufferedReader(new InputStreamReader(p.getErrorStream()));
-			
-		  while ((s = stdInput.readLine()) != null) {
-				simulation_0.println(s);
-			}
-			simulation_0.println("python script executed");
+                  StepCoSim(timeStep);
+                  simulation_0.println("python script executed");
                                 
             }
             catch (IOException e) {
@@ -220,6 +217,59 @@ simulation_0.println("=====> Total time to Run = " + dfTime.format((System.nanoT
         
         
         }
+        StopCoSim();
+    }
+
+    private void StartCoSim() throws IOException {
+        /*
+        Start 'CoSim.py' once in server mode. The human model stays in memory and is advanced by one coupling step per request.
+        */
+        String [] cmd = {"python3", "CoSim.py", "--server"};
+        coSim = new ProcessBuilder(cmd).redirectErrorStream(true).start();
+        coSimInput = new BufferedWriter(new OutputStreamWriter(coSim.getOutputStream()));
+        coSimOutput = new BufferedReader(new InputStreamReader(coSim.getInputStream()));
+    }
+
+    private void StepCoSim(double timeStep) throws IOException {
+        /*
+        Request one coupling step and print the output from the python model until the end-of-step line
+        */
+        if (coSim == null || !coSim.isAlive()) {
+            StartCoSim();
+        }
+        coSimInput.write("step " + Double.toString(timeStep));
+        coSimInput.newLine();
+        coSimInput.flush();
+        String s;
+        while ((s = coSimOutput.readLine()) != null) {
+            if (s.startsWith("END ok")) {
+                simulation_0.println("CoSim: " + s.substring(3).trim());
+                return;
+            }
+            if (s.startsWith("END")) {
+                throw new IOException("CoSim server: " + s.substring(3).trim());
+            }
+            simulation_0.println(s);
+        }
+        throw new IOException("CoSim server terminated");
+    }
+
+    private void StopCoSim() {
+        /*
+        Stop the python model
+        */
+        if (coSim == null) {
+            return;
+        }
+        try {
+            coSimInput.write("quit");
+            coSimInput.newLine();
+            coSimInput.flush();
+            coSim.waitFor();
+        }
+        catch (IOException | InterruptedException e) {
+            coSim.destroy();
+        }
     }
 
     private void SetInputs(double[] caseSettings, double[] simSettings) {